@@ -0,0 +1,285 @@
+import importlib.util
+import math
+import numpy as np
+import noise
+import pygame
+from flowfield import GRAD3, PERM
+from render import ParticleRenderer, bin_counts
+
+DEFAULT_BACKEND = 'numpy'
+
+
+class NumpyBackend:
+    # Whole-array maths: ParticleSystem.update_range for the step,
+    # render.bin_counts for the density grid and the batched
+    # render.ParticleRenderer for drawing.
+    #
+    # Every backend has the same three methods:
+    #   step(particles, start, end, t, ...) advances particles start..end-1
+    #     in place, like ParticleSystem.update_range
+    #   density(x, y, grid_size, cols, rows) returns a (cols, rows) count
+    #     array, like render.bin_counts
+    #   render(surface, x, y, colors, particle_size, particle_shape) draws
+    #     the particles, like ParticleRenderer.draw
+    name = 'numpy'
+
+    @staticmethod
+    def available():
+        return True
+
+    def __init__(self):
+        self.renderer = ParticleRenderer()
+
+    def step(self, particles, start, end, t, flip_dim=False, speed=3.0, steering_strength=0.01, lfo_val=0.0, resample=True):
+        particles.update_range(start, end, t, flip_dim, speed, steering_strength, lfo_val, resample)
+
+    def density(self, x, y, grid_size, cols, rows):
+        return bin_counts(x, y, grid_size, cols, rows)
+
+    def render(self, surface, x, y, colors, particle_size=3, particle_shape=0):
+        self.renderer.draw(surface, x, y, colors, particle_size, particle_shape)
+
+
+class ReferenceBackend:
+    # One particle at a time in plain Python, the way the original
+    # Particle.update, Particle.draw and draw_density_background did it,
+    # noise.pnoise3 included. Far too slow for big counts; it is the
+    # yardstick the other backends are checked against (bench.py --parity).
+    name = 'reference'
+
+    @staticmethod
+    def available():
+        return True
+
+    def step(self, particles, start, end, t, flip_dim=False, speed=3.0, steering_strength=0.01, lfo_val=0.0, resample=True):
+        if end <= start:
+            return
+        width, height = particles.width, particles.height
+        scale = particles.noise_scale
+        xs = particles.x[start:end].tolist()
+        ys = particles.y[start:end].tolist()
+        vxs = particles.vx[start:end].tolist()
+        vys = particles.vy[start:end].tolist()
+        degs = particles.angle_deg[start:end].tolist()
+        field = None
+        if resample and particles.field is not None:
+            # A cached field is sampled for the whole range at once
+            field = particles.field.angles(particles.x[start:end], particles.y[start:end], t, flip_dim, lfo_val).tolist()
+        for i in range(end - start):
+            x, y, vx, vy = xs[i], ys[i], vxs[i], vys[i]
+            if not resample:
+                angle = math.radians(degs[i])
+            elif field is not None:
+                angle = field[i]
+            elif not flip_dim:
+                angle = noise.pnoise3((x + lfo_val) * scale, y * scale, t) * 2 * math.pi
+            else:
+                angle = noise.pnoise3(y * scale, (x + lfo_val) * scale, t) * 2 * math.pi
+            target_vx = math.cos(angle) * speed
+            target_vy = math.sin(angle) * speed
+            vx += (target_vx - vx) * steering_strength
+            vy += (target_vy - vy) * steering_strength
+            x += vx
+            y += vy
+            if resample:
+                degs[i] = (math.degrees(angle) + 360) % 360
+            if x < 0: x += width
+            if x > width: x -= width
+            if y < 0: y += height
+            if y > height: y -= height
+            xs[i], ys[i], vxs[i], vys[i] = x, y, vx, vy
+        particles.x[start:end] = xs
+        particles.y[start:end] = ys
+        particles.vx[start:end] = vxs
+        particles.vy[start:end] = vys
+        particles.angle_deg[start:end] = degs
+
+    def density(self, x, y, grid_size, cols, rows):
+        density = [[0] * rows for _ in range(cols)]
+        for px, py in zip(x.tolist(), y.tolist()):
+            col = int(px // grid_size)
+            row = int(py // grid_size)
+            if 0 <= col < cols and 0 <= row < rows:
+                density[col][row] += 1
+        return np.array(density, dtype=np.intp).reshape(cols, rows)
+
+    def render(self, surface, x, y, colors, particle_size=3, particle_shape=0):
+        size = max(1, int(particle_size))
+        for px, py, color in zip(x.tolist(), y.tolist(), colors.tolist()):
+            if particle_shape == 0:
+                pygame.draw.circle(surface, color, (int(px), int(py)), size)
+            else:
+                pygame.draw.rect(surface, color, (int(px) - size, int(py) - size, 2 * size, 2 * size))
+
+
+_kernels = None
+
+
+def _compile_kernels():
+    # Built on first use rather than at import: importing numba alone takes
+    # longer than the rest of startup. cache=True keeps the machine code on
+    # disk between runs.
+    global _kernels
+    if _kernels is not None:
+        return _kernels
+    import numba
+    njit = numba.njit(cache=True, nogil=True)
+
+    f32 = np.float32
+
+    @njit
+    def fade(t):
+        return t * t * t * (t * (t * f32(6) - f32(15)) + f32(10))
+
+    @njit
+    def grad(perm, grad3, h, x, y, z):
+        g = perm[h] & 15
+        return grad3[g, 0] * x + grad3[g, 1] * y + grad3[g, 2] * z
+
+    @njit
+    def lerp(t, a, b):
+        return a + t * (b - a)
+
+    @njit
+    def pnoise3(perm, grad3, x, y, z):
+        # Scalar noise.pnoise3 with the default repeat of 1024 and base 0,
+        # in float32 throughout like the C version (and flowfield.pnoise3),
+        # so the result is bit for bit the same
+        x = f32(x)
+        y = f32(y)
+        z = f32(z)
+        i = int(np.floor(np.fmod(x, f32(1024))))
+        j = int(np.floor(np.fmod(y, f32(1024))))
+        k = int(np.floor(np.fmod(z, f32(1024))))
+        ii = np.fmod(i + 1, 1024) & 255
+        jj = np.fmod(j + 1, 1024) & 255
+        kk = np.fmod(k + 1, 1024) & 255
+        i &= 255
+        j &= 255
+        k &= 255
+        x -= np.floor(x)
+        y -= np.floor(y)
+        z -= np.floor(z)
+        one = f32(1)
+        fx = fade(x)
+        fy = fade(y)
+        fz = fade(z)
+        a = perm[i]
+        aa = perm[a + j]
+        ab = perm[a + jj]
+        b = perm[ii]
+        ba = perm[b + j]
+        bb = perm[b + jj]
+        return lerp(fz, lerp(fy, lerp(fx, grad(perm, grad3, aa + k, x, y, z),
+                                          grad(perm, grad3, ba + k, x - one, y, z)),
+                                 lerp(fx, grad(perm, grad3, ab + k, x, y - one, z),
+                                          grad(perm, grad3, bb + k, x - one, y - one, z))),
+                        lerp(fy, lerp(fx, grad(perm, grad3, aa + kk, x, y, z - one),
+                                          grad(perm, grad3, ba + kk, x - one, y, z - one)),
+                                 lerp(fx, grad(perm, grad3, ab + kk, x, y - one, z - one),
+                                          grad(perm, grad3, bb + kk, x - one, y - one, z - one))))
+
+    @njit
+    def sample(x, y, start, end, t, flip_dim, lfo_val, scale, perm, grad3, out):
+        for p in range(start, end):
+            nx = (x[p] + lfo_val) * scale
+            ny = y[p] * scale
+            if flip_dim:
+                nx, ny = ny, nx
+            out[p - start] = np.float64(pnoise3(perm, grad3, nx, ny, t)) * (2 * math.pi)
+
+    @njit
+    def integrate(x, y, vx, vy, angle_deg, angles, start, end, speed, steering_strength, width, height, resample):
+        for p in range(start, end):
+            if resample:
+                angle = angles[p - start]
+            else:
+                angle = math.radians(angle_deg[p])
+            vx[p] += (math.cos(angle) * speed - vx[p]) * steering_strength
+            vy[p] += (math.sin(angle) * speed - vy[p]) * steering_strength
+            x[p] += vx[p]
+            y[p] += vy[p]
+            if resample:
+                angle_deg[p] = (math.degrees(angle) + 360) % 360
+            if x[p] < 0:
+                x[p] += width
+            if x[p] > width:
+                x[p] -= width
+            if y[p] < 0:
+                y[p] += height
+            if y[p] > height:
+                y[p] -= height
+
+    @njit
+    def density(x, y, grid_size, cols, rows, out):
+        inv = 1.0 / grid_size
+        for p in range(len(x)):
+            if x[p] < 0 or y[p] < 0:
+                continue
+            col = int(x[p] * inv)
+            row = int(y[p] * inv)
+            if col < cols and row < rows:
+                out[col, row] += 1
+
+    _kernels = dict(sample=sample, integrate=integrate, density=density)
+    return _kernels
+
+
+class NumbaBackend:
+    # The step and density loops compiled with numba, one pass over the
+    # particles with no temporary arrays. Only listed when numba is
+    # installed. Drawing goes through the NumPy renderer: pygame surfaces
+    # can't be touched from compiled code.
+    name = 'numba'
+
+    @staticmethod
+    def available():
+        return importlib.util.find_spec('numba') is not None
+
+    def __init__(self):
+        self.kernels = _compile_kernels()
+        self.renderer = ParticleRenderer()
+        self.perm = PERM.astype(np.int64)
+        self.grad3 = GRAD3
+        self.angles = np.zeros(0)
+
+    def step(self, particles, start, end, t, flip_dim=False, speed=3.0, steering_strength=0.01, lfo_val=0.0, resample=True):
+        if end <= start:
+            return
+        angles = self.angles
+        if resample:
+            if particles.field is not None:
+                angles = particles.field.angles(particles.x[start:end], particles.y[start:end], t, flip_dim, lfo_val)
+            else:
+                if len(self.angles) < end - start:
+                    self.angles = np.empty(particles.capacity)
+                angles = self.angles
+                self.kernels['sample'](particles.x, particles.y, start, end, t, flip_dim, lfo_val,
+                                       particles.noise_scale, self.perm, self.grad3, angles)
+        self.kernels['integrate'](particles.x, particles.y, particles.vx, particles.vy, particles.angle_deg, angles,
+                                  start, end, speed, steering_strength, float(particles.width), float(particles.height),
+                                  resample)
+
+    def density(self, x, y, grid_size, cols, rows):
+        out = np.zeros((cols, rows), dtype=np.intp)
+        self.kernels['density'](x, y, float(grid_size), cols, rows, out)
+        return out
+
+    def render(self, surface, x, y, colors, particle_size=3, particle_shape=0):
+        self.renderer.draw(surface, x, y, colors, particle_size, particle_shape)
+
+
+BACKENDS = {backend.name: backend for backend in (ReferenceBackend, NumpyBackend, NumbaBackend)}
+
+
+def available_backends():
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+
+def create_backend(name):
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"unknown backend {name!r}; choose from {', '.join(BACKENDS)}")
+    if not backend.available():
+        raise ValueError(f"backend {name!r} is not available (is numba installed?)")
+    return backend()
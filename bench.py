@@ -0,0 +1,531 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# Runs headless (e.g. on CI); must be set before pygame initialises video
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np
+import noise
+import pygame
+from backends import available_backends, create_backend
+from flowfield import NOISE_SCALE, BakedField, FieldGrid, flow_angles, pnoise3
+from render import ParticleRenderer
+from simulation import TIME_STEP, Simulation
+
+WIDTH, HEIGHT = 2560, 1440
+PIPELINE_COUNTS = (1000, 10000, 100000)
+DENSITY_GRID_SIZES = (4, 32, 128)
+# Size 1 is scattered into the pixels, size 6 goes through the stamp blits
+DRAW_SIZES = (1, 6)
+# Every particle size the menu offers, for the backend parity check
+PARITY_DRAW_SIZES = range(1, 11)
+# A stage only counts as a regression if it is this much slower than the
+# baseline (fraction) and also slower by at least REGRESSION_MIN_MS
+REGRESSION_THRESHOLD = 0.25
+REGRESSION_MIN_MS = 0.05
+# Particle counts for --backends; the reference backend is pure Python
+BACKEND_COUNTS = (1000, 10000)
+# Time from launching the app to its first frame that --startup fails above
+STARTUP_TARGET_MS = 500
+
+
+def time_call(fn, repeat=5):
+    # Best-of-N wall time in seconds
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def time_stage(fn, repeat=10, warmup=2):
+    # Median and best wall time in milliseconds. The median is what baselines
+    # are compared on; it is far less noisy than the mean on shared CI boxes.
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return dict(median_ms=statistics.median(times), min_ms=min(times))
+
+
+def _cpu_model():
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def machine_fingerprint():
+    # What the timings depend on. `id` hashes the fields so results from
+    # different machines or library versions are easy to tell apart.
+    info = dict(
+        cpu=_cpu_model(),
+        cpu_count=os.cpu_count(),
+        machine=platform.machine(),
+        system=platform.system(),
+        release=platform.release(),
+        python=platform.python_version(),
+        numpy=np.__version__,
+        pygame=pygame.version.ver,
+        sdl='.'.join(map(str, pygame.get_sdl_version())),
+    )
+    info['id'] = hashlib.sha1(json.dumps(info, sort_keys=True).encode()).hexdigest()[:12]
+    return info
+
+
+def bench_pipeline(counts=PIPELINE_COUNTS, grid_sizes=DENSITY_GRID_SIZES, draw_sizes=DRAW_SIZES,
+                   width=WIDTH, height=HEIGHT, repeat=10, seed=0):
+    # Times every stage of a frame in isolation on an offscreen surface:
+    # particle update, noise sampling, particle draw, spatial hash build and
+    # flocking, density background per grid size and menu draw. Each row is keyed by (stage, variant, particles).
+    from main import build_menu, menu_params
+    pygame.init()
+    surface = pygame.Surface((width, height))
+    results = []
+
+    def record(stage, variant, particles, fn):
+        row = dict(stage=stage, variant=variant, particles=particles)
+        row.update(time_stage(fn, repeat))
+        results.append(row)
+
+    for n in counts:
+        sim = Simulation(width, height, n, seed=seed)
+        particles = sim.particles
+        sim.step()
+        record('update', 'exact', n, sim.step)
+        sim.params['field_grid_enabled'] = True
+        record('update', 'field_grid', n, sim.step)
+        sim.params['field_grid_enabled'] = False
+        sim.params['baked_field_enabled'] = True
+        record('update', 'baked_field', n, sim.step)
+        sim.params['baked_field_enabled'] = False
+        x, y = particles.x[:n].copy(), particles.y[:n].copy()
+        record('noise', 'exact', n, lambda: flow_angles(x, y, sim.t))
+        record('noise', 'baked', n, lambda: sim.baked_field.angles(x, y, sim.t))
+        for size in draw_sizes:
+            sim.params['particle_size'] = size
+            record('draw', f'size={size}', n, lambda: sim.draw_particles(surface))
+        sim.params['particle_size'] = 1
+        sim.params['color_directional'] = True
+        record('draw', 'size=1,directional', n, lambda: sim.draw_particles(surface))
+        sim.params['color_directional'] = False
+        record('spatial', 'build,cell=15', n, lambda: sim.flocking.grid.build(particles.x[:n], particles.y[:n]))
+        record('flocking', 'radius=15', n, lambda: sim.flocking.apply(particles, n, 15.0))
+        for grid_size in grid_sizes:
+            record('density', f'grid={grid_size}', n, lambda: sim.density_bg.draw(surface, particles, grid_size))
+
+    menu = build_menu(width, height)
+    params = menu_params(Simulation(width, height, 0).params)
+    mouse_pos = (width - 1, height - 1)
+    record('ui', 'cached', None, lambda: menu.draw(surface, params, mouse_pos, False, 0))
+
+    def redraw():
+        menu.rendered_state = None
+        menu.draw(surface, params, mouse_pos, False, 0)
+
+    record('ui', 'redraw', None, redraw)
+    return results
+
+
+def _worker_counts(max_workers):
+    # 1, 2, 4, ... up to and including max_workers
+    counts = []
+    w = 1
+    while w < max_workers:
+        counts.append(w)
+        w *= 2
+    return counts + [max_workers]
+
+
+def bench_parallel(counts=PIPELINE_COUNTS, max_workers=None, width=WIDTH, height=HEIGHT, repeat=10, seed=0):
+    # Particle update through a parallel.WorkerPool with 1..max_workers
+    # processes. `speedup` is relative to the one-worker pool, which pays the
+    # same barrier round trip per frame.
+    from parallel import SharedParticleSystem, WorkerPool
+    max_workers = max_workers or os.cpu_count() or 1
+    results = []
+    for n in counts:
+        single = None
+        for workers in _worker_counts(max_workers):
+            particles = SharedParticleSystem(n, width, height, rng=np.random.default_rng(seed))
+            pool = WorkerPool(particles, workers, time_step=TIME_STEP)
+            frame = [0]
+
+            def step():
+                pool.step(frame[0] * TIME_STEP)
+                frame[0] += 1
+
+            try:
+                row = dict(stage='update', variant=f'workers={workers}', particles=n)
+                row.update(time_stage(step, repeat))
+            finally:
+                pool.close()
+                particles.close()
+            single = single or row['median_ms']
+            row['speedup'] = single / row['median_ms']
+            results.append(row)
+    return results
+
+
+def _row_key(row):
+    return (row['stage'], row['variant'], row['particles'])
+
+
+def compare_to_baseline(results, baseline, threshold=REGRESSION_THRESHOLD, min_ms=REGRESSION_MIN_MS):
+    # Rows whose median got slower than the baseline's by more than
+    # `threshold` (and by at least min_ms). Rows missing from either side are
+    # ignored.
+    previous = {_row_key(row): row for row in baseline['results']}
+    regressions = []
+    for row in results:
+        old = previous.get(_row_key(row))
+        if old is None:
+            continue
+        ratio = row['median_ms'] / max(old['median_ms'], 1e-9)
+        row['baseline_ms'] = old['median_ms']
+        row['ratio'] = ratio
+        if ratio > 1 + threshold and row['median_ms'] - old['median_ms'] >= min_ms:
+            regressions.append(row)
+    return regressions
+
+
+def run_pipeline_suite(args):
+    counts = tuple(args.counts)
+    results = bench_pipeline(counts=counts, width=args.width, height=args.height, repeat=args.repeat)
+    if args.workers > 0:
+        results += bench_parallel(counts=counts, max_workers=args.workers, width=args.width, height=args.height,
+                                  repeat=args.repeat)
+    report = dict(
+        fingerprint=machine_fingerprint(),
+        config=dict(width=args.width, height=args.height, counts=list(counts), repeat=args.repeat, workers=args.workers,
+                    grid_sizes=list(DENSITY_GRID_SIZES), draw_sizes=list(DRAW_SIZES)),
+        results=results,
+    )
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['fingerprint'].get('id') != report['fingerprint']['id']:
+            print(f"warning: baseline was recorded on a different machine ({baseline['fingerprint'].get('cpu')}); "
+                  f"timings may not be comparable", file=sys.stderr)
+        if baseline.get('config') != report['config']:
+            print("warning: baseline was recorded with a different configuration", file=sys.stderr)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        report['baseline'] = dict(path=args.baseline, threshold=args.threshold, regressions=len(regressions))
+
+    print(f"pipeline {args.width}x{args.height} on {report['fingerprint']['cpu']} ({report['fingerprint']['id']}):")
+    for row in results:
+        particles = '-' if row['particles'] is None else row['particles']
+        line = f"  {row['stage']:<8} {row['variant']:<20} {particles:>7}: {row['median_ms']:8.3f} ms  (best {row['min_ms']:.3f})"
+        if 'speedup' in row:
+            line += f"  {row['speedup']:4.2f}x vs 1 worker"
+        if 'ratio' in row:
+            line += f"  {row['ratio']:5.2f}x baseline"
+            if row in regressions:
+                line += "  REGRESSION"
+        print(line)
+    if args.json:
+        if args.json == '-':
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+    if regressions:
+        print(f"{len(regressions)} stage(s) regressed by more than {args.threshold:.0%}", file=sys.stderr)
+        raise SystemExit(1)
+
+
+def bench_startup(command=None, runs=5):
+    # Wall time from starting the process to it exiting after its first
+    # display.flip (main.py --frames 1), so slightly more than time to first
+    # frame. The first run is reported separately: it is the one that pays
+    # for cold disk caches. `command` is e.g. the frozen binary; by default
+    # `python main.py`. The child inherits SDL_VIDEODRIVER, so set it to time
+    # a real window.
+    if command is None:
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')]
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([*command, '--frames', '1'], check=True, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    warm = times[1:] or times
+    return dict(command=' '.join(command), first_ms=times[0], median_ms=statistics.median(warm), min_ms=min(warm),
+                ok=statistics.median(warm) <= STARTUP_TARGET_MS)
+
+
+def check_noise_parity(samples=100000, seed=0, tolerance=1e-6):
+    # Compare the vectorised sampler against noise.pnoise3, both on raw noise
+    # coordinates (including negatives and the 1024 repeat boundary) and on
+    # flow-field angles with flip_dim and an LFO offset.
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-50, 1100, samples)
+    y = rng.uniform(-50, 1100, samples)
+    z = rng.uniform(-10, 2100, samples)
+    expected = np.array([noise.pnoise3(a, b, c) for a, b, c in zip(x.tolist(), y.tolist(), z.tolist())])
+    raw_error = float(np.abs(pnoise3(x, y, z) - expected).max())
+
+    px = rng.uniform(0, WIDTH, samples)
+    py = rng.uniform(0, HEIGHT, samples)
+    angle_error = 0.0
+    for flip_dim in (False, True):
+        for lfo_val in (0.0, -123.4, 500.0):
+            t = float(rng.uniform(0, 50))
+            got = flow_angles(px, py, t, flip_dim, lfo_val, NOISE_SCALE)
+            if flip_dim:
+                pairs = zip(py.tolist(), (px + lfo_val).tolist())
+            else:
+                pairs = zip((px + lfo_val).tolist(), py.tolist())
+            want = np.array([noise.pnoise3(a * NOISE_SCALE, b * NOISE_SCALE, t) for a, b in pairs]) * 2 * math.pi
+            angle_error = max(angle_error, float(np.abs(got - want).max()))
+    ok = raw_error <= tolerance and angle_error <= tolerance * 2 * math.pi
+    return dict(ok=ok, samples=samples, max_noise_error=raw_error, max_angle_error=angle_error)
+
+
+def _wrapped_error(a, b, period):
+    # Largest difference between positions, counting a wrap around the edge
+    # as close
+    d = np.abs(a - b) % period
+    return float(np.minimum(d, period - d).max()) if len(d) else 0.0
+
+
+def check_backend_parity(particles=2000, steps=120, width=640, height=360, seed=0, tolerance=1e-6):
+    # Every available backend against the reference one: the same seeded
+    # particles stepped through a run that covers flip_dim, the LFO and
+    # skipped noise samples must end up in the same place with the same
+    # velocities, and density grids and drawn frames of those positions must
+    # match. Frames are drawn at every particle size and shape. Footprints
+    # the batched renderer stamps rather than scatters have their colours
+    # bucketed, so those pixels may be off by up to
+    # ParticleRenderer.STAMP_COLOR_ERROR per channel; everything else must
+    # be exact.
+    params = dict(speed=3.0, steering_strength=0.05)
+    runs = {}
+    for name in available_backends():
+        sim = Simulation(width, height, particles, seed=seed, backend=name)
+        sim.params.update(params)
+        sim.params.update(lfo_enabled=True, lfo_amplitude=200.0, lfo_rate=1.0)
+        for i in range(steps):
+            sim.flip_dim = i >= steps // 2
+            sim.update_every = 3 if i % 40 >= 30 else 1
+            sim.step()
+        runs[name] = sim
+    reference = runs['reference']
+    pygame.init()
+    results = []
+    for name, sim in runs.items():
+        a, b = sim.particles, reference.particles
+        n = len(b)
+        position_error = max(_wrapped_error(a.x[:n], b.x[:n], width), _wrapped_error(a.y[:n], b.y[:n], height))
+        velocity_error = float(max(np.abs(a.vx[:n] - b.vx[:n]).max(), np.abs(a.vy[:n] - b.vy[:n]).max()))
+        # Density and drawing on the reference positions, so only the
+        # backend's own binning and rasterising are compared
+        x, y = b.x[:n], b.y[:n]
+        density_ok = all(np.array_equal(sim.backend.density(x, y, g, width // g + 1, height // g + 1),
+                                        reference.backend.density(x, y, g, width // g + 1, height // g + 1))
+                         for g in (4, 32))
+        colors = reference.color_mapper.colors(b, color_directional=True)[:n]
+        pixels_differ = 0
+        max_color_error = 0
+        color_ok = True
+        renderer = ParticleRenderer()
+        for size in PARITY_DRAW_SIZES:
+            for shape in (0, 1):
+                got = pygame.Surface((width, height))
+                want = pygame.Surface((width, height))
+                sim.backend.render(got, x, y, colors, size, shape)
+                reference.backend.render(want, x, y, colors, size, shape)
+                error = np.abs(pygame.surfarray.array3d(got).astype(int) - pygame.surfarray.array3d(want)).max(axis=2)
+                stamped = len(renderer.footprint(size, shape)[0]) > renderer.SCATTER_MAX_PIXELS
+                allowed = renderer.STAMP_COLOR_ERROR if stamped and name != 'reference' else 0
+                pixels_differ += int((error > 0).sum())
+                max_color_error = max(max_color_error, int(error.max()))
+                color_ok = color_ok and int(error.max()) <= allowed
+        ok = (position_error <= tolerance * steps and velocity_error <= tolerance * steps and density_ok and color_ok)
+        results.append(dict(backend=name, position_error=position_error, velocity_error=velocity_error,
+                            density_ok=density_ok, pixels_differ=pixels_differ, max_color_error=max_color_error, ok=ok))
+    return results
+
+
+def bench_backends(counts=BACKEND_COUNTS, width=WIDTH, height=HEIGHT, repeat=5, seed=0):
+    # Step, density and draw for each available backend side by side, on
+    # the same seeded particles. The first call is left out of the timing,
+    # so the JIT backend's compile doesn't count.
+    pygame.init()
+    surface = pygame.Surface((width, height))
+    results = []
+    for n in counts:
+        sim = Simulation(width, height, n, seed=seed)
+        particles = sim.particles
+        sim.step()
+        x, y = particles.x[:n].copy(), particles.y[:n].copy()
+        colors = sim.color_mapper.colors(particles, color_directional=True)[:n]
+        grid = 32
+        cols, rows = width // grid + 1, height // grid + 1
+        for name in available_backends():
+            backend = create_backend(name)
+            row = dict(backend=name, particles=n)
+            for stage, fn in (('step', lambda: backend.step(particles, 0, n, sim.t)),
+                              ('density', lambda: backend.density(x, y, grid, cols, rows)),
+                              ('draw', lambda: backend.render(surface, x, y, colors, 1, 0))):
+                row[f'{stage}_ms'] = time_stage(fn, repeat, warmup=1)['median_ms']
+            results.append(row)
+    return results
+
+
+def bench_noise(counts=(1000, 10000, 100000), seed=0):
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in counts:
+        x = rng.uniform(0, WIDTH, n)
+        y = rng.uniform(0, HEIGHT, n)
+
+        def scalar():
+            pn = noise.pnoise3
+            [pn(a * NOISE_SCALE, b * NOISE_SCALE, 1.0) for a, b in zip(x.tolist(), y.tolist())]
+
+        def vectorised():
+            flow_angles(x, y, 1.0)
+
+        scalar_s = time_call(scalar, repeat=3)
+        vector_s = time_call(vectorised)
+        results.append(dict(particles=n, scalar_ms=scalar_s * 1000, vectorised_ms=vector_s * 1000, speedup=scalar_s / vector_s))
+    return results
+
+
+def measure_field_grid_error(cell_sizes=(8, 16, 32, 64), refresh_frames=(1, 4, 8), samples=50000, frames=120, seed=0):
+    # Angle error of FieldGrid against exact sampling over a run of frames,
+    # with and without flip_dim/LFO offset. Errors are in radians.
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, WIDTH, samples)
+    y = rng.uniform(0, HEIGHT, samples)
+    results = []
+    for cell in cell_sizes:
+        for refresh in refresh_frames:
+            grid = FieldGrid(WIDTH, HEIGHT, cell, refresh)
+            max_err = 0.0
+            total = 0.0
+            n = 0
+            for frame in range(0, frames, 3):
+                t = frame * 0.005
+                flip_dim = frame % 2 == 1
+                lfo_val = 250.0 * math.sin(frame * 0.1)
+                err = np.abs(grid.angles(x, y, t, flip_dim, lfo_val) - flow_angles(x, y, t, flip_dim, lfo_val))
+                max_err = max(max_err, float(err.max()))
+                total += float(err.sum())
+                n += err.size
+            grid_s = time_call(lambda: grid.angles(x, y, frames * 0.005 + 0.001))
+            results.append(dict(cell_size=cell, refresh_frames=refresh, max_angle_error=max_err,
+                                mean_angle_error=total / n, sample_ms=grid_s * 1000))
+    return results
+
+
+def measure_baked_field(samples=50000, frames=120, seed=0):
+    # Like measure_field_grid_error for BakedField at its default lattice.
+    # The bake is made (or reused from BAKE_DIR) before timing. Also checks
+    # that the loop closes: one period later the field is the same.
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, WIDTH, samples)
+    y = rng.uniform(0, HEIGHT, samples)
+    baked = BakedField(WIDTH, HEIGHT)
+    start = time.perf_counter()
+    baked.volume()
+    load_s = time.perf_counter() - start
+    max_err = 0.0
+    loop_err = 0.0
+    for frame in range(0, frames, 3):
+        t = frame * 0.005
+        got = baked.angles(x, y, t)
+        # Exact noise differs from the periodic version in the last lattice
+        # step before the wrap only, which these frames don't reach
+        max_err = max(max_err, float(np.abs(got - flow_angles(x, y, t)).max()))
+        loop_err = max(loop_err, float(np.abs(baked.angles(x, y, t + baked.period) - got).max()))
+    sample_s = time_call(lambda: baked.angles(x, y, 1.001))
+    return dict(cell_size=baked.cell_size, period=baked.period, max_angle_error=max_err, loop_error=loop_err,
+                load_ms=load_s * 1000, sample_ms=sample_s * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perlin Particle Playground benchmarks")
+    parser.add_argument('--parity', action='store_true', help="only run the noise and backend parity checks")
+    parser.add_argument('--pipeline', action='store_true', help="time each frame stage in isolation")
+    parser.add_argument('--counts', type=int, nargs='+', default=list(PIPELINE_COUNTS), help="particle counts for --pipeline")
+    parser.add_argument('--width', type=int, default=WIDTH)
+    parser.add_argument('--height', type=int, default=HEIGHT)
+    parser.add_argument('--repeat', type=int, default=10, help="timed runs per stage (the median is reported)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="time the parallel update with 1, 2, 4 ... up to this many worker processes (0 to skip)")
+    parser.add_argument('--json', help="write --pipeline results as JSON to this file ('-' for stdout)")
+    parser.add_argument('--baseline', help="JSON from an earlier --pipeline run to compare against")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="fail if a stage is this much slower than the baseline (0.25 = 25%%)")
+    parser.add_argument('--backends', action='store_true', help="compare the step/density/draw backends side by side")
+    parser.add_argument('--startup', nargs='*', metavar='COMMAND',
+                        help="time launch to first frame of main.py, or of COMMAND (e.g. the frozen binary)")
+    args = parser.parse_args()
+
+    if args.startup is not None:
+        row = bench_startup(args.startup or None)
+        print(f"startup {row['command']}: first run {row['first_ms']:.0f} ms, then median {row['median_ms']:.0f} ms "
+              f"(best {row['min_ms']:.0f})  {'OK' if row['ok'] else 'FAIL'} (target {STARTUP_TARGET_MS} ms)")
+        raise SystemExit(0 if row['ok'] else 1)
+
+    if args.pipeline:
+        run_pipeline_suite(args)
+        return
+
+    parity = check_noise_parity()
+    print(f"noise parity: {'OK' if parity['ok'] else 'FAIL'} "
+          f"(max noise error {parity['max_noise_error']:.2e}, max angle error {parity['max_angle_error']:.2e}, {parity['samples']} samples)")
+    backend_parity = check_backend_parity()
+    for row in backend_parity:
+        print(f"backend parity {row['backend']:<9}: {'OK' if row['ok'] else 'FAIL'} (position error {row['position_error']:.2e} px, "
+              f"velocity error {row['velocity_error']:.2e}, density {'same' if row['density_ok'] else 'DIFFERENT'}, "
+              f"{row['pixels_differ']} pixels differ, max colour error {row['max_color_error']})")
+    parity_ok = parity['ok'] and all(row['ok'] for row in backend_parity)
+    if args.parity:
+        raise SystemExit(0 if parity_ok else 1)
+    if args.backends:
+        print(f"backends {args.width}x{args.height} (median ms):")
+        for row in bench_backends(width=args.width, height=args.height, repeat=args.repeat):
+            print(f"  {row['backend']:<9} {row['particles']:>7}: step {row['step_ms']:9.3f}  density {row['density_ms']:8.3f}  "
+                  f"draw {row['draw_ms']:8.3f}")
+        raise SystemExit(0 if parity_ok else 1)
+    for row in bench_noise():
+        print(f"noise {row['particles']:>7} particles: scalar {row['scalar_ms']:8.2f} ms  "
+              f"vectorised {row['vectorised_ms']:7.2f} ms  ({row['speedup']:.1f}x)")
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, WIDTH, 50000)
+    y = rng.uniform(0, HEIGHT, 50000)
+    exact_s = time_call(lambda: flow_angles(x, y, 1.0))
+    print(f"field grid (50000 particles, exact sampling {exact_s * 1000:.2f} ms):")
+    for row in measure_field_grid_error():
+        print(f"  cell {row['cell_size']:>3} refresh {row['refresh_frames']:>2}: max error {math.degrees(row['max_angle_error']):6.2f} deg  "
+              f"mean {math.degrees(row['mean_angle_error']):5.2f} deg  {row['sample_ms']:6.2f} ms")
+    row = measure_baked_field()
+    print(f"baked field (cell {row['cell_size']}, period {row['period']}): max error {math.degrees(row['max_angle_error']):6.2f} deg  "
+          f"loop error {row['loop_error']:.1e}  bake/load {row['load_ms']:7.2f} ms  {row['sample_ms']:6.2f} ms")
+    if not parity_ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,11 +12,12 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('presets', 'presets'), ('fonts', 'fonts')],
     hiddenimports=hiddenimports,
     hookspath=[],
     runtime_hooks=[],
-    excludes=[],
+    # pygame works without pkg_resources and importing it slows startup
+    excludes=['pkg_resources'],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
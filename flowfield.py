@@ -0,0 +1,284 @@
+import math
+import os
+from collections import OrderedDict
+import numpy as np
+
+NOISE_SCALE = 0.002
+
+# Baked, looping fields (see BakedField) are cached here between runs
+BAKE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bakes')
+# How far past the left and right edges a bake reaches, to cover the LFO offset
+BAKE_MARGIN = 512
+
+# Permutation and gradient tables from the `noise` package (_noise.h), so the
+# vectorised sampler reproduces noise.pnoise3 exactly up to float rounding.
+_PERM = np.array([
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225,
+    140, 36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148, 247,
+    120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117, 35, 11, 32, 57,
+    177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175, 74,
+    165, 71, 134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111, 229, 122,
+    60, 211, 133, 230, 220, 105, 92, 41, 55, 46, 245, 40, 244, 102, 143, 54,
+    65, 25, 63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208, 89, 18, 169,
+    200, 196, 135, 130, 116, 188, 159, 86, 164, 100, 109, 198, 173, 186, 3,
+    64, 52, 217, 226, 250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85,
+    212, 207, 206, 59, 227, 47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170,
+    213, 119, 248, 152, 2, 44, 154, 163, 70, 221, 153, 101, 155, 167, 43,
+    172, 9, 129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178, 185,
+    112, 104, 218, 246, 97, 228, 251, 34, 242, 193, 238, 210, 144, 12, 191,
+    179, 162, 241, 81, 51, 145, 235, 249, 14, 239, 107, 49, 192, 214, 31,
+    181, 199, 106, 157, 184, 84, 204, 176, 115, 121, 50, 45, 127, 4, 150,
+    254, 138, 236, 205, 93, 222, 114, 67, 29, 24, 72, 243, 141, 128, 195,
+    78, 66, 215, 61, 156, 180,
+], dtype=np.intp)
+PERM = np.concatenate([_PERM, _PERM])
+# PERM & 15, used for the final gradient lookups
+_HASH = PERM & 15
+
+GRAD3 = np.array([
+    (1, 1, 0), (-1, 1, 0), (1, -1, 0), (-1, -1, 0),
+    (1, 0, 1), (-1, 0, 1), (1, 0, -1), (-1, 0, -1),
+    (0, 1, 1), (0, -1, 1), (0, 1, -1), (0, -1, -1),
+    (1, 0, -1), (-1, 0, -1), (0, -1, 1), (0, 1, 1),
+], dtype=np.float32)
+_GX, _GY, _GZ = (np.ascontiguousarray(GRAD3[:, i]) for i in range(3))
+
+
+def _fade(t):
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+def _grad(h, x, y, z):
+    return _GX[h] * x + _GY[h] * y + _GZ[h] * z
+
+
+def _lattice(v, repeat, base):
+    floor = np.floor(v)
+    if v.size and 0 <= floor.min() and floor.max() < repeat:
+        # fmod is a no-op inside [0, repeat) and is slow, so skip it
+        i = floor.astype(np.intp)
+    else:
+        i = np.floor(np.fmod(v, np.float32(repeat))).astype(np.intp)
+    ii = np.fmod(i + 1, repeat)
+    return (i & 255) + base, (ii & 255) + base, v - floor
+
+
+def pnoise3(x, y, z, repeatx=1024, repeaty=1024, repeatz=1024, base=0):
+    # Array version of noise.pnoise3 (single octave). Arguments broadcast, and
+    # the maths is done in float32 like the C implementation.
+    x = np.asarray(x, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    z = np.asarray(z, dtype=np.float32)
+    i, ii, x = _lattice(x, repeatx, base)
+    j, jj, y = _lattice(y, repeaty, base)
+    k, kk, z = _lattice(z, repeatz, base)
+    fx = _fade(x)
+    fy = _fade(y)
+    fz = _fade(z)
+    x1 = x - 1
+    y1 = y - 1
+    z1 = z - 1
+
+    A = PERM[i]
+    AA = PERM[A + j]
+    AB = PERM[A + jj]
+    B = PERM[ii]
+    BA = PERM[B + j]
+    BB = PERM[B + jj]
+
+    def lerp(t, a, b):
+        return a + t * (b - a)
+
+    return lerp(fz, lerp(fy, lerp(fx, _grad(_HASH[AA + k], x, y, z),
+                                      _grad(_HASH[BA + k], x1, y, z)),
+                             lerp(fx, _grad(_HASH[AB + k], x, y1, z),
+                                      _grad(_HASH[BB + k], x1, y1, z))),
+                    lerp(fy, lerp(fx, _grad(_HASH[AA + kk], x, y, z1),
+                                      _grad(_HASH[BA + kk], x1, y, z1)),
+                             lerp(fx, _grad(_HASH[AB + kk], x, y1, z1),
+                                      _grad(_HASH[BB + kk], x1, y1, z1))))
+
+
+def flow_angles(x, y, t, flip_dim=False, lfo_val=0.0, noise_scale=NOISE_SCALE):
+    # Flow-field angle in radians for every (x, y) at time t, matching
+    # pnoise3((x + lfo) * scale, y * scale, t) * 2pi from the scalar path.
+    nx = (np.asarray(x) + lfo_val) * noise_scale
+    ny = np.asarray(y) * noise_scale
+    if flip_dim:
+        nx, ny = ny, nx
+    values = pnoise3(nx, ny, t)
+    return values.astype(np.float64) * (2 * math.pi)
+
+
+def _bilinear(field, fx, fy):
+    # field sampled at fractional (column, row) positions; positions off the
+    # lattice take the edge value
+    rows, cols = field.shape
+    ix = np.clip(np.floor(fx).astype(np.intp), 0, cols - 2)
+    iy = np.clip(np.floor(fy).astype(np.intp), 0, rows - 2)
+    tx = np.clip(fx - ix, 0.0, 1.0)
+    ty = np.clip(fy - iy, 0.0, 1.0)
+    flat = field.ravel()
+    idx = iy * cols + ix
+    v00 = flat[idx]
+    v01 = flat[idx + 1]
+    v10 = flat[idx + cols]
+    v11 = flat[idx + cols + 1]
+    top = v00 + (v01 - v00) * tx
+    bottom = v10 + (v11 - v10) * tx
+    return top + (bottom - top) * ty
+
+
+class FieldGrid:
+    # Approximates flow_angles by evaluating the noise once per time slice on
+    # a coarse lattice and interpolating: bilinearly in space, linearly
+    # between the two time slices around t. Noise cost then depends on the
+    # lattice size instead of the particle count. cell_size is the
+    # quality/perf knob; refresh_frames is how many frames of `time_step`
+    # each time slice spans.
+    def __init__(self, width, height, cell_size=32, refresh_frames=4, time_step=0.005, noise_scale=NOISE_SCALE, cache_size=4):
+        self.width = width
+        self.height = height
+        self.time_step = time_step
+        self.noise_scale = noise_scale
+        self.cache_size = cache_size
+        self.cell_size = None
+        self.refresh_frames = None
+        self.margin = 0
+        self.slices = OrderedDict()
+        self.configure(cell_size, refresh_frames)
+
+    def configure(self, cell_size, refresh_frames):
+        cell_size = max(1, int(cell_size))
+        refresh_frames = max(1, int(refresh_frames))
+        if (cell_size, refresh_frames) != (self.cell_size, self.refresh_frames):
+            self.cell_size = cell_size
+            self.refresh_frames = refresh_frames
+            self.slices.clear()
+
+    def _slice(self, k, flip_dim):
+        key = (k, flip_dim)
+        values = self.slices.get(key)
+        if values is not None:
+            self.slices.move_to_end(key)
+            return values
+        cell = self.cell_size
+        gx = np.arange(-self.margin, self.width + self.margin + 2 * cell, cell, dtype=np.float64)
+        gy = np.arange(0, self.height + 2 * cell, cell, dtype=np.float64)
+        sx = gx[np.newaxis, :] * self.noise_scale
+        sy = gy[:, np.newaxis] * self.noise_scale
+        t = k * self.refresh_frames * self.time_step
+        if flip_dim:
+            values = pnoise3(sy, sx, t)
+        else:
+            values = pnoise3(sx, sy, t)
+        self.slices[key] = values
+        while len(self.slices) > self.cache_size:
+            self.slices.popitem(last=False)
+        return values
+
+    def angles(self, x, y, t, flip_dim=False, lfo_val=0.0):
+        # The lattice extends past the screen edges far enough to cover the
+        # LFO offset; it only ever grows so a swinging LFO doesn't thrash the
+        # cache.
+        needed = math.ceil(abs(lfo_val) / self.cell_size) * self.cell_size
+        if needed > self.margin:
+            self.margin = needed
+            self.slices.clear()
+        pos = t / (self.refresh_frames * self.time_step)
+        k = math.floor(pos)
+        w = pos - k
+        field = self._slice(k, flip_dim)
+        if w > 1e-9:
+            field = field + (self._slice(k + 1, flip_dim) - field) * np.float32(w)
+        fx = (np.asarray(x) + lfo_val + self.margin) / self.cell_size
+        fy = np.asarray(y) / self.cell_size
+        return _bilinear(field, fx, fy) * (2 * math.pi)
+
+
+class BakedField:
+    # Flow field computed ahead of time for a whole loop: the noise is made
+    # periodic in time (pnoise3's repeatz) with `period` noise-time units,
+    # sampled on a lattice of cell_size pixels at `slices` time slices per
+    # unit, and stored as a (period * slices, rows, cols) float32 .npy under
+    # `directory`. The file name is the key (noise scale, size, lattice,
+    # period), so a later run with the same settings maps the existing bake
+    # instead of computing it again. Sampling then interpolates like
+    # FieldGrid, wrapping from the last slice back to the first.
+    def __init__(self, width, height, period=8, cell_size=16, slices=16, margin=BAKE_MARGIN,
+                 noise_scale=NOISE_SCALE, directory=BAKE_DIR):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.slices = slices
+        self.margin = margin
+        self.noise_scale = noise_scale
+        self.directory = directory
+        self.period = None
+        self.volumes = {}
+        self.configure(period)
+
+    def configure(self, period):
+        period = max(1, int(period))
+        if period != self.period:
+            self.period = period
+            self.volumes.clear()
+
+    def shape(self):
+        cell = self.cell_size
+        cols = (self.width + 2 * self.margin) // cell + 2
+        rows = self.height // cell + 2
+        return self.period * self.slices, rows, cols
+
+    def path(self, flip_dim=False):
+        name = (f"field_s{self.noise_scale:g}_{self.width}x{self.height}+{self.margin}_c{self.cell_size}"
+                f"_p{self.period}x{self.slices}{'_flip' if flip_dim else ''}.npy")
+        return os.path.join(self.directory, name)
+
+    def volume(self, flip_dim=False):
+        # The baked volume, mapped read-only; bakes it first if no file with
+        # this key exists yet
+        volume = self.volumes.get(flip_dim)
+        if volume is None:
+            path = self.path(flip_dim)
+            if os.path.exists(path):
+                volume = np.load(path, mmap_mode='r')
+            if volume is None or volume.shape != self.shape() or volume.dtype != np.float32:
+                volume = self.bake(path, flip_dim)
+            self.volumes[flip_dim] = volume
+        return volume
+
+    def bake(self, path, flip_dim=False):
+        # One time slice at a time through a memory map, under a temporary
+        # name so an interrupted bake is never picked up
+        frames, rows, cols = self.shape()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(frames, rows, cols))
+        gx = np.arange(cols, dtype=np.float64) * self.cell_size - self.margin
+        gy = np.arange(rows, dtype=np.float64) * self.cell_size
+        sx = gx[np.newaxis, :] * self.noise_scale
+        sy = gy[:, np.newaxis] * self.noise_scale
+        for k in range(frames):
+            t = k / self.slices
+            if flip_dim:
+                out[k] = pnoise3(sy, sx, t, repeatz=self.period)
+            else:
+                out[k] = pnoise3(sx, sy, t, repeatz=self.period)
+        out.flush()
+        del out
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode='r')
+
+    def angles(self, x, y, t, flip_dim=False, lfo_val=0.0):
+        volume = self.volume(flip_dim)
+        frames = len(volume)
+        pos = (t % self.period) * self.slices
+        k = min(int(pos), frames - 1)
+        w = pos - k
+        field = volume[k]
+        if w > 1e-9:
+            field = field + (volume[(k + 1) % frames] - field) * np.float32(w)
+        fx = (np.asarray(x) + lfo_val + self.margin) / self.cell_size
+        fy = np.asarray(y) / self.cell_size
+        return _bilinear(field, fx, fy) * (2 * math.pi)
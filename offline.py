@@ -0,0 +1,133 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+# No display needed; must be set before pygame initialises video. The
+# pygame banner would also end up in a raw stream written to stdout.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from backends import DEFAULT_BACKEND, available_backends
+from simulation import DEFAULT_PARAMS, SIM_HZ, Simulation, default_params, load_preset
+from snapshot import load_snapshot, save_snapshot, snapshot_paths
+
+
+def _bool(value):
+    if value.lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    if value.lower() in ('0', 'false', 'no', 'off'):
+        return False
+    raise argparse.ArgumentTypeError(f"expected a boolean, got {value!r}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Render a Perlin particle sequence without a display")
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--particles', type=int, default=10000)
+    parser.add_argument('--frames', type=int, default=300, help="total length of the sequence")
+    parser.add_argument('--start', type=int, default=0,
+                        help="first frame to write; earlier frames are still simulated so ranges can be split across machines")
+    parser.add_argument('--end', type=int, default=None, help="frame to stop before (default: --frames)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--flip-dim', action='store_true')
+    parser.add_argument('--fps', type=float, default=None,
+                        help="output frame rate; with --sim-hz, steps per frame follow the ratio (default: one step per frame)")
+    parser.add_argument('--sim-hz', type=float, default=SIM_HZ, help="simulation steps per second when --fps is given")
+    parser.add_argument('--workers', type=int, default=1, help="processes for the particle update (output is identical)")
+    parser.add_argument('--backend', choices=available_backends(), default=DEFAULT_BACKEND,
+                        help="implementation of the step, density and draw maths (see backends.py)")
+    parser.add_argument('--preset', help="preset (or snapshot .json) to take parameter defaults from; options below still override it")
+    parser.add_argument('--snapshot',
+                        help="start from a saved snapshot instead of seeded random positions; its parameters are the defaults")
+    parser.add_argument('--save-snapshot', help="write a snapshot of the state after the last frame, e.g. to resume later")
+    parser.add_argument('--format', choices=('png', 'raw'), default='png',
+                        help="png: one file per frame; raw: packed RGB24 frames appended to one stream")
+    parser.add_argument('--out', default='frames',
+                        help="directory for png frames, or file for the raw stream ('-' for stdout)")
+    # One option per simulation parameter, named after its DEFAULT_PARAMS key
+    for key, default in default_params().items():
+        option = '--' + key.replace('_', '-')
+        if isinstance(default, bool):
+            parser.add_argument(option, type=_bool, default=default, metavar='BOOL')
+        elif isinstance(default, list):
+            parser.add_argument(option, type=int, nargs=len(default), default=list(default))
+        else:
+            parser.add_argument(option, type=type(default), default=default)
+    return parser
+
+
+def params_from_args(args):
+    params = default_params()
+    for key in DEFAULT_PARAMS:
+        value = getattr(args, key)
+        params[key] = list(value) if isinstance(value, list) else value
+    return params
+
+
+def render_offline(args, params=None):
+    # Runs the simulation uncapped and writes frames start..end-1. Output only
+    # depends on the arguments, so the same seed gives the same bytes.
+    params = params if params is not None else params_from_args(args)
+    end = args.frames if args.end is None else min(args.end, args.frames)
+    pygame.init()
+    screen = pygame.Surface((args.width, args.height))
+    sim = Simulation(args.width, args.height, args.particles, params=params, seed=args.seed, workers=args.workers,
+                     sim_hz=args.sim_hz, backend=args.backend)
+    sim.flip_dim = args.flip_dim
+    if args.snapshot:
+        # Parameters on the command line default to the snapshot's (see main)
+        load_snapshot(args.snapshot, sim)
+        sim.params.update(params)
+        sim.flip_dim = sim.flip_dim or args.flip_dim
+
+    stream = None
+    if args.format == 'raw':
+        stream = sys.stdout.buffer if args.out == '-' else open(args.out, 'wb')
+    else:
+        os.makedirs(args.out, exist_ok=True)
+    try:
+        for frame in range(end):
+            writing = frame >= args.start
+            # With --fps the simulation runs at its own rate and frames are
+            # drawn in between steps; otherwise each frame is one step
+            alpha = sim.advance(1.0 / args.fps, max_steps=None) if args.fps else None
+            # The density background blends over the previous frame, so
+            # skipped frames still have to be drawn for the trails to match
+            if writing or params['show_density_bg']:
+                sim.draw_background(screen)
+                if alpha is None:
+                    sim.step()
+                sim.draw_particles(screen, alpha)
+            elif alpha is None:
+                sim.step()
+            if not writing:
+                continue
+            if stream is not None:
+                stream.write(pygame.image.tobytes(screen, 'RGB'))
+            else:
+                pygame.image.save(screen, os.path.join(args.out, f"frame_{frame:06d}.png"))
+        if args.save_snapshot:
+            save_snapshot(args.save_snapshot, sim)
+    finally:
+        sim.close()
+        if stream is not None and stream is not sys.stdout.buffer:
+            stream.close()
+    pygame.quit()
+
+
+def main(argv=None):
+    parser = build_parser()
+    known = parser.parse_known_args(argv)[0]
+    preset = known.preset or (known.snapshot and snapshot_paths(known.snapshot)[1])
+    if preset:
+        parser.set_defaults(**load_preset(preset))
+    render_offline(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    # Worker processes are spawned; in the frozen build they re-enter here
+    multiprocessing.freeze_support()
+    main()
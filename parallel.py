@@ -0,0 +1,211 @@
+import multiprocessing as mp
+import secrets
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+from backends import BACKENDS, create_backend
+from particles import ParticleSystem
+from flowfield import NOISE_SCALE, BakedField, FieldGrid
+
+# Per-frame control block shared with the workers, one float64 per slot
+(CMD, GENERATION, CAPACITY, COUNT, T, FLIP_DIM, SPEED, STEERING, LFO_VAL, FIELD_GRID, GRID_CELL, GRID_REFRESH, RESAMPLE,
+ BAKED_FIELD, BAKE_PERIOD, BACKEND) = range(16)
+CONTROL_SIZE = 16
+CMD_STEP, CMD_EXIT = 0, 1
+
+# How long the main process waits for a frame before assuming a worker died
+FRAME_TIMEOUT = 30.0
+
+
+def _block_name(prefix, generation):
+    return f"{prefix}_{generation}"
+
+
+def _attach(particles, block, capacity):
+    # Point the particle arrays at a (len(FIELDS), capacity) float64 block
+    arrays = np.ndarray((len(particles.FIELDS), capacity), dtype=np.float64, buffer=block.buf)
+    for name, row in zip(particles.FIELDS, arrays):
+        setattr(particles, name, row)
+    particles.capacity = capacity
+
+
+def _release(block, unlink=False):
+    try:
+        block.close()
+    except BufferError:
+        # A view into the block is still alive somewhere; the mapping goes
+        # away with it
+        pass
+    if unlink:
+        block.unlink()
+
+
+class SharedParticleSystem(ParticleSystem):
+    # ParticleSystem whose arrays live in one multiprocessing.shared_memory
+    # block. Growing the store creates a new block under the next generation
+    # number; workers notice the change and re-attach by name, so particle
+    # data is never pickled.
+    def __init__(self, count, width, height, noise_scale=NOISE_SCALE, rng=None):
+        self.prefix = f"ppp_{secrets.token_hex(6)}"
+        self.generation = 0
+        self.block = None
+        self.retired = None
+        super().__init__(count, width, height, noise_scale=noise_scale, rng=rng)
+
+    def _allocate(self, capacity):
+        self.generation += 1
+        block = shared_memory.SharedMemory(name=_block_name(self.prefix, self.generation), create=True,
+                                           size=len(self.FIELDS) * capacity * 8)
+        arrays = np.ndarray((len(self.FIELDS), capacity), dtype=np.float64, buffer=block.buf)
+        arrays[:] = 0.0
+        self.block, self.retired = block, self.block
+        return list(arrays)
+
+    def reserve(self, n):
+        super().reserve(n)
+        # The previous block has been copied over by now
+        if self.retired is not None:
+            _release(self.retired, unlink=True)
+            self.retired = None
+
+    def use_arrays(self, arrays):
+        # Workers can only see shared memory, so this one has to copy
+        self.count = 0
+        self.reserve(arrays.shape[1])
+        for name, row in zip(self.FIELDS, arrays):
+            getattr(self, name)[:len(row)] = row
+        self.count = arrays.shape[1]
+        self.version += 1
+
+    def close(self):
+        if self.block is not None:
+            for name in self.FIELDS:
+                setattr(self, name, np.zeros(0))
+            _release(self.block, unlink=True)
+            self.block = None
+
+
+def _worker(index, workers, prefix, control_name, barrier, width, height, noise_scale, time_step):
+    control_block = shared_memory.SharedMemory(name=control_name)
+    control = np.ndarray((CONTROL_SIZE,), dtype=np.float64, buffer=control_block.buf)
+    particles = ParticleSystem(0, width, height, noise_scale=noise_scale)
+    grid = FieldGrid(width, height, time_step=time_step, noise_scale=noise_scale)
+    # Maps the bake the main process made (see Simulation.step)
+    baked = BakedField(width, height, noise_scale=noise_scale)
+    # Index into backends.BACKENDS; the backend is recreated when it changes
+    backend = None
+    block = None
+    generation = 0
+    try:
+        while True:
+            barrier.wait()
+            if control[CMD] == CMD_EXIT:
+                break
+            if int(control[GENERATION]) != generation:
+                generation = int(control[GENERATION])
+                for name in particles.FIELDS:
+                    setattr(particles, name, np.zeros(0))
+                if block is not None:
+                    _release(block)
+                block = shared_memory.SharedMemory(name=_block_name(prefix, generation))
+                _attach(particles, block, int(control[CAPACITY]))
+            # Contiguous partition of the live particles
+            count = int(control[COUNT])
+            start = count * index // workers
+            end = count * (index + 1) // workers
+            if control[BAKED_FIELD]:
+                baked.configure(int(control[BAKE_PERIOD]))
+                particles.field = baked
+            elif control[FIELD_GRID]:
+                grid.configure(int(control[GRID_CELL]), int(control[GRID_REFRESH]))
+                particles.field = grid
+            else:
+                particles.field = None
+            name = list(BACKENDS)[int(control[BACKEND])]
+            if backend is None or backend.name != name:
+                backend = create_backend(name)
+            backend.step(particles, start, end, control[T], bool(control[FLIP_DIM]), control[SPEED],
+                         control[STEERING], control[LFO_VAL], bool(control[RESAMPLE]))
+            barrier.wait()
+    except BaseException:
+        # Wake the main process instead of leaving it blocked on the barrier
+        barrier.abort()
+        raise
+    finally:
+        del control
+        for name in particles.FIELDS:
+            setattr(particles, name, np.zeros(0))
+        if block is not None:
+            _release(block)
+        _release(control_block)
+
+
+class WorkerPool:
+    # Persistent worker processes that each advance one contiguous partition
+    # of a SharedParticleSystem per frame. The main process writes the frame's
+    # parameters into a shared control block, releases the workers through a
+    # barrier and waits on the same barrier until every partition is done.
+    def __init__(self, particles, workers, time_step=0.005, noise_scale=NOISE_SCALE):
+        self.particles = particles
+        self.workers = workers
+        # spawn rather than fork: the main process may already have SDL up
+        ctx = mp.get_context('spawn')
+        self.control_block = shared_memory.SharedMemory(name=f"{particles.prefix}_control", create=True,
+                                                        size=CONTROL_SIZE * 8)
+        self.control = np.ndarray((CONTROL_SIZE,), dtype=np.float64, buffer=self.control_block.buf)
+        self.control[:] = 0.0
+        self.barrier = ctx.Barrier(workers + 1)
+        self.processes = [
+            ctx.Process(target=_worker, name=f"particle-worker-{i}", daemon=True,
+                        args=(i, workers, particles.prefix, self.control_block.name, self.barrier,
+                              particles.width, particles.height, particles.noise_scale, time_step))
+            for i in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+
+    def step(self, t, flip_dim=False, speed=3.0, steering_strength=0.01, lfo_val=0.0,
+             field_grid=False, grid_cell_size=32, grid_refresh=4, count=None, resample=True, baked_field=False, bake_period=8,
+             backend=None):
+        # `count` limits the update to the first count particles; `backend`
+        # is an index into backends.BACKENDS, the NumPy one by default
+        particles = self.particles
+        control = self.control
+        control[CMD] = CMD_STEP
+        control[GENERATION] = particles.generation
+        control[CAPACITY] = particles.capacity
+        control[COUNT] = particles.count if count is None else min(count, particles.count)
+        control[T] = t
+        control[FLIP_DIM] = flip_dim
+        control[SPEED] = speed
+        control[STEERING] = steering_strength
+        control[LFO_VAL] = lfo_val
+        control[FIELD_GRID] = field_grid
+        control[GRID_CELL] = grid_cell_size
+        control[GRID_REFRESH] = grid_refresh
+        control[RESAMPLE] = resample
+        control[BAKED_FIELD] = baked_field
+        control[BAKE_PERIOD] = bake_period
+        control[BACKEND] = list(BACKENDS).index('numpy') if backend is None else backend
+        try:
+            self.barrier.wait(FRAME_TIMEOUT)
+            self.barrier.wait(FRAME_TIMEOUT)
+        except threading.BrokenBarrierError:
+            raise RuntimeError("a particle worker failed; see its traceback above") from None
+
+    def close(self):
+        if self.control_block is None:
+            return
+        if not self.barrier.broken:
+            self.control[CMD] = CMD_EXIT
+            try:
+                self.barrier.wait(FRAME_TIMEOUT)
+            except threading.BrokenBarrierError:
+                pass
+        for process in self.processes:
+            process.join(FRAME_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        del self.control
+        _release(self.control_block, unlink=True)
+        self.control_block = None
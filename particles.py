@@ -0,0 +1,130 @@
+import math
+import numpy as np
+from flowfield import flow_angles
+
+# Arrays grow in whole chunks so "Add 1k" doesn't reallocate every click
+CHUNK_SIZE = 16384
+
+
+def lfo_value(t, lfo_enabled=False, lfo_amplitude=0.0, lfo_rate=0.0, waveform=0):
+    # LFO value with waveform selection
+    if not lfo_enabled or lfo_rate <= 0:
+        return 0.0
+    phase = t * lfo_rate
+    if waveform == 0:  # Sine
+        return lfo_amplitude * math.sin(phase * 2 * math.pi)
+    elif waveform == 1:  # Square
+        return lfo_amplitude * (1 if math.sin(phase * 2 * math.pi) >= 0 else -1)
+    elif waveform == 2:  # Triangle
+        return lfo_amplitude * (2 * abs(2 * (phase % 1) - 1) - 1)
+    elif waveform == 3:  # Saw
+        return lfo_amplitude * (2 * (phase % 1) - 1)
+    return 0.0
+
+
+class ParticleSystem:
+    # Structure-of-arrays particle store. Only the first `count` entries of
+    # each array are live; the rest is spare capacity.
+    FIELDS = ('x', 'y', 'vx', 'vy', 'angle_deg')
+
+    def __init__(self, count, width, height, noise_scale=0.002, rng=None):
+        self.width = width
+        self.height = height
+        self.noise_scale = noise_scale
+        self.rng = rng if rng is not None else np.random.default_rng()
+        # Optional flowfield.FieldGrid or BakedField; None samples the noise exactly
+        self.field = None
+        self.count = 0
+        self.capacity = 0
+        # Bumped whenever positions change, so anything derived from them
+        # (the flocking grid) can tell it's out of date
+        self.version = 0
+        for name in self.FIELDS:
+            setattr(self, name, np.zeros(0))
+        self.add(count)
+
+    def __len__(self):
+        return self.count
+
+    def _allocate(self, capacity):
+        # One zeroed array per field; subclasses may back them differently
+        return [np.zeros(capacity) for _ in self.FIELDS]
+
+    def reserve(self, n):
+        if n <= self.capacity:
+            return
+        capacity = -(-n // CHUNK_SIZE) * CHUNK_SIZE
+        for name, new in zip(self.FIELDS, self._allocate(capacity)):
+            old = getattr(self, name)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def use_arrays(self, arrays):
+        # Take over the rows of a (len(FIELDS), n) array as the particle store
+        # without copying, e.g. a memory-mapped snapshot
+        for name, row in zip(self.FIELDS, arrays):
+            setattr(self, name, row)
+        self.count = self.capacity = arrays.shape[1]
+        self.version += 1
+
+    def add(self, n):
+        start = self.count
+        end = start + n
+        self.reserve(end)
+        self.x[start:end] = self.rng.uniform(0, self.width, n)
+        self.y[start:end] = self.rng.uniform(0, self.height, n)
+        self.vx[start:end] = 0.0
+        self.vy[start:end] = 0.0
+        self.angle_deg[start:end] = 0.0
+        self.count = end
+        self.version += 1
+
+    def remove(self, n):
+        self.count = max(0, self.count - n)
+        self.version += 1
+
+    def randomise_positions(self):
+        n = self.count
+        self.x[:n] = self.rng.uniform(0, self.width, n)
+        self.y[:n] = self.rng.uniform(0, self.height, n)
+        self.vx[:n] = 0.0
+        self.vy[:n] = 0.0
+        self.version += 1
+
+    def sample_angles(self, x, y, t, flip_dim=False, lfo_val=0.0):
+        if self.field is not None:
+            return self.field.angles(x, y, t, flip_dim, lfo_val)
+        return flow_angles(x, y, t, flip_dim, lfo_val, self.noise_scale)
+
+    def update(self, t, flip_dim=False, speed=3.0, steering_strength=0.01, lfo_enabled=False, lfo_amplitude=0.0, lfo_rate=0.0, waveform=0,
+               count=None, resample=True):
+        lfo_val = lfo_value(t, lfo_enabled, lfo_amplitude, lfo_rate, waveform)
+        end = self.count if count is None else min(count, self.count)
+        self.update_range(0, end, t, flip_dim, speed, steering_strength, lfo_val, resample)
+
+    def update_range(self, start, end, t, flip_dim=False, speed=3.0, steering_strength=0.01, lfo_val=0.0, resample=True):
+        # Noise sample, steer, integrate and wrap particles start..end-1. Each
+        # particle only depends on itself, so disjoint ranges can be updated
+        # independently (see parallel.py). With resample=False the noise isn't
+        # sampled and particles keep steering towards their last angle.
+        if end <= start:
+            return
+        x = self.x[start:end]
+        y = self.y[start:end]
+        vx = self.vx[start:end]
+        vy = self.vy[start:end]
+        if resample:
+            angle = self.sample_angles(x, y, t, flip_dim, lfo_val)
+        else:
+            angle = np.radians(self.angle_deg[start:end])
+        vx += (np.cos(angle) * speed - vx) * steering_strength
+        vy += (np.sin(angle) * speed - vy) * steering_strength
+        x += vx
+        y += vy
+        if resample:
+            np.mod(np.degrees(angle) + 360, 360, out=self.angle_deg[start:end])
+        x[x < 0] += self.width
+        x[x > self.width] -= self.width
+        y[y < 0] += self.height
+        y[y > self.height] -= self.height
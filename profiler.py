@@ -0,0 +1,141 @@
+import csv
+import time
+import numpy as np
+import pygame
+from ui import TextCache
+
+# Frame stages in the order main() runs them; `scale` is stretching the
+# render-scale buffer over the window, `record` copying the frame for the
+# recorder and `wait` is the frame cap sleep
+FRAME_STAGES = ('events', 'update', 'background', 'particles', 'scale', 'record', 'ui', 'hud', 'flip', 'wait')
+
+
+class FrameProfiler:
+    # Wall time per stage per frame in a ring buffer of the last `capacity`
+    # frames. Call begin_frame(), then mark(stage) as each stage finishes and
+    # end_frame() last. While disabled every call returns straight away.
+    def __init__(self, stages=FRAME_STAGES, capacity=600, csv_path=None):
+        self.stages = stages
+        self.columns = {stage: i for i, stage in enumerate(stages)}
+        self.capacity = capacity
+        # One row per frame: stage times in ms, then the particle count
+        self.samples = np.zeros((capacity, len(stages) + 1))
+        self.index = 0
+        self.filled = 0
+        self.frame = 0
+        self.last = None
+        self.csv_file = None
+        self.csv_writer = None
+        self.enabled = False
+        if csv_path:
+            self.open_csv(csv_path)
+
+    def open_csv(self, path):
+        self.csv_file = open(path, 'w', newline='')
+        self.csv_writer = csv.writer(self.csv_file)
+        self.csv_writer.writerow(['frame', *(f'{stage}_ms' for stage in self.stages), 'total_ms', 'particles'])
+        self.enabled = True
+
+    def close(self):
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.csv_writer = None
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.samples[self.index] = 0.0
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        if not self.enabled or self.last is None:
+            return
+        now = time.perf_counter()
+        self.samples[self.index, self.columns[stage]] += (now - self.last) * 1000.0
+        self.last = now
+
+    def end_frame(self, particle_count):
+        if not self.enabled or self.last is None:
+            return
+        row = self.samples[self.index]
+        row[-1] = particle_count
+        if self.csv_writer is not None:
+            times = row[:-1].tolist()
+            self.csv_writer.writerow([self.frame, *(f'{ms:.3f}' for ms in times), f'{sum(times):.3f}', particle_count])
+        self.index = (self.index + 1) % self.capacity
+        self.filled = min(self.filled + 1, self.capacity)
+        self.frame += 1
+        self.last = None
+
+    def stats(self):
+        # {stage: (mean ms, p95 ms)} over the buffered frames, plus 'total',
+        # and the latest particle count
+        if self.filled == 0:
+            return {}, 0
+        rows = self.samples[:self.filled] if self.filled < self.capacity else self.samples
+        times = rows[:, :-1]
+        result = {stage: (float(times[:, i].mean()), float(np.percentile(times[:, i], 95)))
+                  for i, stage in enumerate(self.stages)}
+        totals = times.sum(axis=1)
+        result['total'] = (float(totals.mean()), float(np.percentile(totals, 95)))
+        latest = self.samples[(self.index - 1) % self.capacity, -1]
+        return result, int(latest)
+
+
+class ProfilerOverlay:
+    # HUD with rolling per-stage averages and p95 in the top right corner.
+    # The text is only re-rendered every `refresh` seconds.
+    def __init__(self, profiler, refresh=0.5):
+        self.profiler = profiler
+        self.refresh = refresh
+        self.visible = False
+        self.updated = 0.0
+        self.cells = []
+        self.surface = None
+
+    def toggle(self):
+        self.visible = not self.visible
+        if self.visible:
+            self.profiler.enabled = True
+            self.updated = 0.0
+        elif self.profiler.csv_writer is None:
+            # Nothing left to record for
+            self.profiler.enabled = False
+
+    def _render(self):
+        stats, particles = self.profiler.stats()
+        rows = [('stage', 'avg ms', 'p95 ms')]
+        for stage in (*self.profiler.stages, 'total'):
+            if stage in stats:
+                mean, p95 = stats[stage]
+                rows.append((stage, f"{mean:.2f}", f"{p95:.2f}"))
+        if 'total' in stats:
+            rows.append(('fps', f"{1000.0 / max(stats['total'][0], 1e-6):.1f}", ''))
+        rows.append(('particles', str(particles), ''))
+        # The font isn't monospaced, so lay the cells out in columns with the
+        # numbers right-aligned
+        while len(self.cells) < len(rows) * 3:
+            self.cells.append(TextCache(28))
+        rendered = [[self.cells[r * 3 + c].render(text) for c, text in enumerate(row)] for r, row in enumerate(rows)]
+        widths = [max(row[c].get_width() for row in rendered) for c in range(3)]
+        line_height = rendered[0][0].get_height()
+        gap = 16
+        self.surface = pygame.Surface((sum(widths) + 2 * gap + 20, line_height * len(rows) + 20), pygame.SRCALPHA)
+        self.surface.fill((0, 0, 0, 180))
+        for r, row in enumerate(rendered):
+            y = 10 + r * line_height
+            self.surface.blit(row[0], (10, y))
+            right = 10 + widths[0]
+            for c in (1, 2):
+                right += gap + widths[c]
+                self.surface.blit(row[c], (right - row[c].get_width(), y))
+
+    def draw(self, surface):
+        if not self.visible:
+            return
+        now = time.perf_counter()
+        if self.surface is None or now - self.updated >= self.refresh:
+            self.updated = now
+            self._render()
+        surface.blit(self.surface, (surface.get_width() - self.surface.get_width() - 10, 10))
@@ -0,0 +1,111 @@
+from collections import deque
+
+# Settings of the auto-quality mode. They describe the machine rather than
+# the look, so they live outside presets and survive Reset.
+QUALITY_DEFAULTS = dict(
+    auto_quality=False,
+    quality_target_fps=60,
+    quality_min_particles=0.25,  # Never draw/update fewer than this fraction
+    quality_max_update_every=4,  # Sample the noise at least every N steps
+    quality_max_grid_size=64,  # Never coarsen the density grid past this
+    quality_min_particle_size=1,  # Never shrink particles below this
+)
+
+
+class QualityController:
+    # Watches how long frames take to compute against a target and steps a
+    # quality level between 0 (everything as set) and `levels` (every knob at
+    # its bound). Each level lowers all knobs a little: active particle
+    # count, noise sampling rate, density grid resolution and particle size.
+    #
+    # Hysteresis: a level is only dropped when the average over `window`
+    # frames is over budget, only raised when it is well under (`headroom`),
+    # and after every change the controller waits `cooldown` frames so the
+    # new level's frame times are what gets measured next. Each time quality
+    # has to be lowered again after being raised, the next raise is held off
+    # twice as long, which stops it flapping between two levels.
+    def __init__(self, levels=8, window=30, cooldown=45, headroom=0.7):
+        self.levels = levels
+        self.window = window
+        self.cooldown = cooldown
+        self.headroom = headroom
+        self.level = 0
+        self.samples = deque(maxlen=window)
+        self.wait = 0
+        self.backoff = 1
+        self.raise_blocked = 0
+        self.last_raised = False
+
+    def reset(self):
+        self.level = 0
+        self.samples.clear()
+        self.wait = 0
+        self.backoff = 1
+        self.raise_blocked = 0
+        self.last_raised = False
+
+    def observe(self, frame_ms, target_ms):
+        # Feed one frame's compute time (not counting the frame-cap sleep).
+        # Returns True when the level changed.
+        if self.raise_blocked > 0:
+            self.raise_blocked -= 1
+        if self.wait > 0:
+            self.wait -= 1
+            return False
+        self.samples.append(frame_ms)
+        if len(self.samples) < self.window:
+            return False
+        average = sum(self.samples) / len(self.samples)
+        if average > target_ms and self.level < self.levels:
+            self.level += 1
+            if self.last_raised:
+                self.backoff = min(self.backoff * 2, 64)
+            self.raise_blocked = self.cooldown * self.backoff
+            self.last_raised = False
+        elif average < target_ms * self.headroom and self.level > 0 and self.raise_blocked == 0:
+            self.level -= 1
+            self.last_raised = True
+        else:
+            return False
+        self.samples.clear()
+        self.wait = self.cooldown
+        return True
+
+    def settings(self, params):
+        # (particle fraction, update_every, min grid size, max particle size)
+        # for the current level, within the user's bounds
+        f = self.level / self.levels
+        fraction = 1.0 - f * (1.0 - params['quality_min_particles'])
+        update_every = 1 + int(f * (params['quality_max_update_every'] - 1) + 0.5)
+        min_grid = int(f * params['quality_max_grid_size'])
+        max_size = None
+        if self.level > 0:
+            size = params['particle_size']
+            min_size = min(params['quality_min_particle_size'], size)
+            max_size = max(min_size, int(size - f * (size - min_size) + 0.5))
+        return fraction, update_every, min_grid, max_size
+
+    def apply(self, sim, params):
+        # Sets the simulation's quality overrides; with auto quality off
+        # everything is back to what the sliders say
+        if not params['auto_quality']:
+            if self.level:
+                self.reset()
+            sim.active_limit = None
+            sim.update_every = 1
+            sim.min_grid_size = 0
+            sim.max_particle_size = None
+            return
+        fraction, update_every, min_grid, max_size = self.settings(params)
+        sim.active_limit = None if fraction >= 1.0 else max(1, int(len(sim.particles) * fraction))
+        sim.update_every = update_every
+        sim.min_grid_size = min_grid
+        sim.max_particle_size = max_size
+
+    def describe(self, sim, params):
+        if not params['auto_quality']:
+            return "Quality: manual"
+        if self.level == 0:
+            return "Quality: full"
+        return (f"Quality: {self.levels - self.level}/{self.levels}  ({sim.active_count()} drawn, "
+                f"noise 1/{sim.update_every}, BG >= {sim.min_grid_size})")
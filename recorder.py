@@ -0,0 +1,143 @@
+import os
+import queue
+import shlex
+import subprocess
+import threading
+import time
+import pygame
+
+# Raw RGB24 frames on stdin; {width}, {height}, {fps} and {out} are filled in
+ENCODER_COMMAND = ("ffmpeg -loglevel error -y -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {fps} -i - "
+                   "-c:v libx264 -pix_fmt yuv420p {out}")
+
+
+class FrameRecorder:
+    # Records presented frames without holding up the render loop. capture()
+    # copies the frame into one of `queue_size` pooled surfaces and queues it
+    # for a background thread that writes a PNG sequence (format 'png') or
+    # pipes raw RGB into an encoder process (format 'pipe'). When every
+    # buffer is still waiting to be written the frame is dropped and counted
+    # rather than waiting for disk or the encoder to catch up.
+    #
+    # stop() returns straight away: the writer thread drains the queue,
+    # shuts the encoder down and then calls on_finish(recorder), if given.
+    def __init__(self, size, out, format='png', fps=60, command=ENCODER_COMMAND, queue_size=8, on_finish=None):
+        self.size = size
+        self.out = out
+        self.format = format
+        self.free = queue.Queue()
+        for _ in range(queue_size):
+            self.free.put(pygame.Surface(size))
+        self.pending = queue.Queue()
+        self.queue_size = queue_size
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.error = None
+        self.process = None
+        self.stopped = False
+        self.on_finish = on_finish
+        if format == 'pipe':
+            width, height = size
+            args = shlex.split(command.format(width=width, height=height, fps=fps, out=shlex.quote(out)))
+            self.process = subprocess.Popen(args, stdin=subprocess.PIPE)
+        else:
+            os.makedirs(out, exist_ok=True)
+        self.thread = threading.Thread(target=self._write, name="frame-writer", daemon=True)
+        self.thread.start()
+
+    def capture(self, surface):
+        # Call once per presented frame. Returns False when the frame was dropped.
+        if self.stopped:
+            return False
+        try:
+            buffer = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        # Frames keep the size recording started at, so a resized window is
+        # scaled to fit
+        if surface.get_size() == self.size:
+            buffer.blit(surface, (0, 0))
+        else:
+            pygame.transform.scale(surface, self.size, buffer)
+        self.pending.put((self.captured, buffer))
+        self.captured += 1
+        return True
+
+    def depth(self):
+        # Frames queued but not written yet
+        return self.pending.qsize()
+
+    def describe(self):
+        text = f"REC {self.written}/{self.captured}  queue {self.depth()}/{self.queue_size}  dropped {self.dropped}"
+        if self.error is not None:
+            text += f"  FAILED: {self.error}"
+        return text
+
+    def _write(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            index, buffer = item
+            if self.error is None:
+                try:
+                    if self.process is not None:
+                        self.process.stdin.write(pygame.image.tobytes(buffer, 'RGB'))
+                    else:
+                        pygame.image.save(buffer, os.path.join(self.out, f"frame_{index:06d}.png"))
+                    self.written += 1
+                except (OSError, pygame.error) as exc:
+                    # Keep draining so capture() sees the buffers come back;
+                    # the error shows up in describe()
+                    self.error = exc
+            self.free.put(buffer)
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            self.process.wait()
+            self.process = None
+        # Nothing is captured after stop(), so the pooled surfaces can go
+        self.free = queue.Queue()
+        if self.on_finish is not None:
+            self.on_finish(self)
+
+    def stop(self):
+        # Stops taking frames and returns without waiting; whatever is still
+        # queued is written out in the background
+        if not self.stopped:
+            self.stopped = True
+            self.pending.put(None)
+
+    def finished(self):
+        return not self.thread.is_alive()
+
+    def close(self):
+        # stop(), then wait for the writer and the encoder to finish
+        self.stop()
+        self.thread.join()
+
+
+def take_path(directory, format):
+    # A fresh output path per recording: a directory of PNGs or a video file.
+    # The path is created here, so it's reserved even before the encoder
+    # opens it. A take stopped within the same second may still be writing,
+    # so a name that is already taken gets a counter instead of being reused.
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("take_%Y%m%d_%H%M%S")
+    suffix = '' if format == 'png' else '.mp4'
+    counter = 1
+    while True:
+        name = stamp if counter == 1 else f"{stamp}_{counter}"
+        path = os.path.join(directory, name + suffix)
+        try:
+            if format == 'png':
+                os.mkdir(path)
+            else:
+                open(path, 'x').close()
+            return path
+        except FileExistsError:
+            counter += 1
@@ -0,0 +1,213 @@
+import asyncio
+import socket
+import struct
+import threading
+from collections import deque
+
+# Actions (button presses) kept waiting for the render loop; older ones are
+# dropped first if a sender floods them
+MAX_PENDING_ACTIONS = 64
+# Kernel receive buffer for the UDP socket, so a burst isn't dropped before
+# the network thread gets to it
+UDP_BUFFER_SIZE = 1 << 20
+MAX_DATAGRAM_SIZE = 65535
+# Extra datagrams read straight off the socket per callback, on loops where
+# that's safe, before TCP connections get a turn again
+UDP_BATCH = 1024
+
+
+def parse_text(line):
+    # "speed 4.2", "/rgb_values/3 128" or "pause": (name, value or None).
+    # A leading slash is allowed so OSC-style addresses work as text too.
+    parts = line.split()
+    if not parts:
+        return None
+    name = parts[0].lstrip('/')
+    value = ' '.join(parts[1:]) or None
+    return name, value
+
+
+def _osc_string(data, offset):
+    end = data.index(b'\0', offset)
+    text = data[offset:end].decode('utf-8', 'replace')
+    # Strings are NUL-terminated and padded to a multiple of 4 bytes
+    return text, (end + 4) & ~3
+
+
+def parse_osc(data):
+    # (name, value) pairs from an OSC packet: a message with a float, int,
+    # string or true/false argument (only the first is used), or a bundle of
+    # them. Anything this doesn't understand is skipped.
+    if data.startswith(b'#bundle\0'):
+        offset = 16  # '#bundle' string and the time tag
+        messages = []
+        while offset + 4 <= len(data):
+            size = struct.unpack_from('>i', data, offset)[0]
+            messages += parse_osc(data[offset + 4:offset + 4 + size])
+            offset += 4 + size
+        return messages
+    address, offset = _osc_string(data, 0)
+    tags = ','
+    if offset < len(data):
+        tags, offset = _osc_string(data, offset)
+    value = None
+    tag = tags[1:2]
+    if tag == 'f':
+        value = struct.unpack_from('>f', data, offset)[0]
+    elif tag == 'i':
+        value = struct.unpack_from('>i', data, offset)[0]
+    elif tag == 'd':
+        value = struct.unpack_from('>d', data, offset)[0]
+    elif tag == 's':
+        value = _osc_string(data, offset)[0]
+    elif tag in ('T', 'F'):
+        value = tag == 'T'
+    return [(address.lstrip('/'), value)]
+
+
+def parse_packet(data):
+    # (name, value) messages from one UDP datagram: an OSC message or bundle,
+    # or text lines. Malformed packets give nothing.
+    try:
+        if (data.startswith(b'/') or data.startswith(b'#bundle\0')) and b'\0' in data:
+            return parse_osc(data)
+        return [parse_text(line) for line in data.decode('utf-8', 'replace').splitlines()]
+    except (ValueError, struct.error):
+        return []
+
+
+class RemoteControl:
+    # Local control server: UDP (text lines or OSC packets) and TCP (text
+    # lines) on one port, served by an asyncio loop on a background thread so
+    # nothing on the network side ever runs on the render thread. Datagrams
+    # are taken in as fast as they arrive, with nothing held back for later
+    # frames, so nothing waits in the kernel buffer. Parameter
+    # updates are coalesced in a dict, newest value per name, and poll()
+    # swaps it out once per frame; however many messages arrive in between,
+    # a frame applies the latest value of each parameter and only that.
+    # Names in `actions` are button presses instead and are kept in order.
+    def __init__(self, actions=(), host='127.0.0.1', port=9000):
+        self.actions = set(actions)
+        self.host = host
+        self.port = port
+        self.lock = threading.Lock()
+        self.updates = {}
+        self.pending_actions = deque(maxlen=MAX_PENDING_ACTIONS)
+        self.received = 0
+        self.loop = None
+        self.connections = set()
+        self.started = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="remote-control", daemon=True)
+
+    def start(self):
+        # Returns once the sockets are bound; raises if they couldn't be
+        self.thread.start()
+        self.started.wait()
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self.loop = loop
+        sock = transport = None
+        try:
+            # A datagram endpoint rather than add_reader, which the Proactor
+            # loop on Windows doesn't have
+            family, _, _, _, address = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_DGRAM)[0]
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_BUFFER_SIZE)
+            sock.bind(address)
+            # Selector loops read one datagram per wakeup; there the protocol
+            # empties the (non-blocking) socket itself. A Proactor loop has
+            # a read of its own in flight, so it's left to deliver them.
+            drain = sock if isinstance(loop, asyncio.SelectorEventLoop) else None
+            transport, _ = loop.run_until_complete(loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self, drain), sock=sock))
+            server = loop.run_until_complete(asyncio.start_server(self._serve_stream, self.host, self.port))
+        except Exception as exc:
+            # Reported by start(), whatever it was
+            self.error = exc
+            if transport is not None:
+                transport.close()
+            elif sock is not None:
+                sock.close()
+            loop.close()
+            return
+        finally:
+            self.started.set()
+        try:
+            loop.run_forever()
+        finally:
+            transport.close()
+            server.close()
+            # Connections still open are closed, which ends their readers,
+            # and their tasks allowed to finish before the loop goes away
+            for writer in list(self.connections):
+                writer.close()
+            tasks = asyncio.all_tasks(loop)
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+
+    async def _serve_stream(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.receive([parse_text(line.decode('utf-8', 'replace'))])
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    def receive(self, messages):
+        # (name, value) messages; runs on the loop's thread
+        with self.lock:
+            for message in messages:
+                if message is None:
+                    continue
+                self.received += 1
+                name, value = message
+                if name in self.actions:
+                    self.pending_actions.append(message)
+                else:
+                    self.updates[name] = value
+
+    def poll(self):
+        # ({name: latest value}, [(action, value), ...]) since the last poll
+        with self.lock:
+            updates, self.updates = self.updates, {}
+            actions = list(self.pending_actions)
+            self.pending_actions.clear()
+        return updates, actions
+
+    def close(self):
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, remote, drain=None):
+        self.remote = remote
+        self.drain = drain
+
+    def datagram_received(self, data, addr):
+        messages = parse_packet(data)
+        if self.drain is not None:
+            for _ in range(UDP_BATCH):
+                try:
+                    data = self.drain.recv(MAX_DATAGRAM_SIZE)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    # e.g. an ICMP error reported on the socket; nothing to apply
+                    continue
+                messages += parse_packet(data)
+        self.remote.receive(messages)
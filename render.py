@@ -0,0 +1,270 @@
+import colorsys
+import numpy as np
+import pygame
+
+DENSITY_LEVELS = 1024
+
+
+def _build_density_lut(levels=DENSITY_LEVELS):
+    # RGBA for density / max_density quantised to `levels` steps. Same colour
+    # ramp as the original per-cell hsv_to_rgb code: blue and dim when empty,
+    # red, bright and opaque at the busiest cell.
+    lut = np.zeros((levels, 4), dtype=np.uint8)
+    for i in range(levels):
+        ratio = i / (levels - 1)
+        hue = (0.6 - 0.6 * ratio) % 1.0
+        brightness = 0.2 + 0.8 * ratio
+        r, g, b = colorsys.hsv_to_rgb(hue, 1, brightness)
+        lut[i] = (int(r * 255), int(g * 255), int(b * 255), int(80 + 175 * ratio))
+    return lut
+
+
+DENSITY_LUT = _build_density_lut()
+
+
+def bin_counts(x, y, grid_size, cols, rows):
+    # Particle count per grid cell as a (cols, rows) array, i.e. indexed
+    # [col, row] like pygame.surfarray
+    inv = 1.0 / grid_size
+    col = (x * inv).astype(np.intp)
+    row = (y * inv).astype(np.intp)
+    inside = (x >= 0) & (col < cols) & (y >= 0) & (row < rows)
+    if not inside.all():
+        col = col[inside]
+        row = row[inside]
+    return np.bincount(col * rows + row, minlength=cols * rows).reshape(cols, rows)
+
+
+class DensityBackground:
+    # Renders the density background into a cells-sized surface (one pixel per
+    # grid cell) and scales it up once. Both surfaces are kept between frames
+    # and only recreated when the grid shape changes.
+    def __init__(self):
+        self.shape = None
+        self.cells = None
+        self.scaled = None
+        self.lut = None
+
+    def _surfaces(self, cols, rows, scaled_size):
+        if self.shape != (cols, rows, scaled_size):
+            self.shape = (cols, rows, scaled_size)
+            self.cells = pygame.Surface((cols, rows), pygame.SRCALPHA)
+            self.scaled = pygame.Surface(scaled_size, pygame.SRCALPHA)
+            # DENSITY_LUT packed into the surface's own pixel format
+            shifts = self.cells.get_shifts()
+            lut = DENSITY_LUT.astype(np.uint32)
+            self.lut = (lut[:, 0] << shifts[0]) | (lut[:, 1] << shifts[1]) | (lut[:, 2] << shifts[2]) | (lut[:, 3] << shifts[3])
+        return self.cells, self.scaled
+
+    def draw(self, surface, particles, grid_size=32, count=None, density=None, binning=bin_counts):
+        # `count` limits the binning to the first count particles. `density`
+        # can pass in counts binned elsewhere (spatial.SpatialGrid.cell_counts
+        # with the same cell size) instead of binning again; otherwise
+        # `binning` does it, with bin_counts' arguments. The grid is in
+        # simulation space and stretched over the whole surface, whatever its
+        # size.
+        grid_size = max(1, int(grid_size))
+        cols = particles.width // grid_size + 1
+        rows = particles.height // grid_size + 1
+        if density is None:
+            n = len(particles) if count is None else min(count, len(particles))
+            density = binning(particles.x[:n], particles.y[:n], grid_size, cols, rows)
+        max_density = int(density.max()) or 1
+        sx = surface.get_width() / particles.width
+        sy = surface.get_height() / particles.height
+        cells, scaled = self._surfaces(cols, rows, (int(cols * grid_size * sx + 0.5), int(rows * grid_size * sy + 0.5)))
+        # Colour for every possible count 0..max_density, then one gather
+        levels = (np.arange(max_density + 1) * (DENSITY_LEVELS - 1) + max_density // 2) // max_density
+        pixels = pygame.surfarray.pixels2d(cells)
+        np.take(self.lut[levels], density, out=pixels)
+        del pixels
+        pygame.transform.scale(cells, scaled.get_size(), scaled)
+        surface.blit(scaled, (0, 0))
+
+
+class RenderTarget:
+    # Where the scene is rasterised: the window itself at scale 1, otherwise
+    # an offscreen buffer `scale` times the window size that present() then
+    # stretches over the window in one call. Lower scales trade sharpness
+    # for fill rate.
+    def __init__(self, scale=1.0):
+        self.scale = scale
+        self.buffer = None
+
+    def surface(self, screen):
+        if self.scale == 1.0:
+            self.buffer = None
+            return screen
+        w, h = screen.get_size()
+        size = (max(1, int(w * self.scale + 0.5)), max(1, int(h * self.scale + 0.5)))
+        if self.buffer is None or self.buffer.get_size() != size:
+            self.buffer = pygame.Surface(size, 0, screen)
+        return self.buffer
+
+    def present(self, screen):
+        if self.buffer is not None:
+            pygame.transform.scale(self.buffer, screen.get_size(), screen)
+
+
+HUE_LUT_SIZE = 1440
+
+
+class ColorMapper:
+    # Per-particle colours from cached lookup tables: a hue ramp indexed by
+    # movement direction (quarter-degree steps) and an RGB gradient indexed by
+    # particle number. Each table is only rebuilt when its inputs change.
+    def __init__(self, hue_steps=HUE_LUT_SIZE):
+        self.hue_steps = hue_steps
+        self.hue_key = None
+        self.hue_lut = None
+        self.gradient_key = None
+        self.gradient = None
+
+    def _hue_lut(self, color_start_hue, color_end_hue):
+        key = (color_start_hue, color_end_hue)
+        if key != self.hue_key:
+            hue1 = color_start_hue / 360.0
+            hue2 = color_end_hue / 360.0
+            if abs(hue2 - hue1) > 0.5:
+                if hue1 > hue2:
+                    hue2 += 1.0
+                else:
+                    hue1 += 1.0
+            lut = np.empty((self.hue_steps + 1, 3), dtype=np.uint8)
+            for i in range(self.hue_steps + 1):
+                hue = (hue1 + (hue2 - hue1) * i / self.hue_steps) % 1.0
+                r, g, b = colorsys.hsv_to_rgb(hue, 1, 1)
+                lut[i] = (int(r * 255), int(g * 255), int(b * 255))
+            self.hue_key = key
+            self.hue_lut = lut
+        return self.hue_lut
+
+    def _gradient(self, rgb_values, total):
+        key = (tuple(rgb_values), total)
+        if key != self.gradient_key:
+            rel = np.arange(total) / max(total - 1, 1)
+            start = np.array(rgb_values[:3], dtype=np.float64)
+            end = np.array(rgb_values[3:6], dtype=np.float64)
+            self.gradient_key = key
+            self.gradient = (start + (end - start) * rel[:, np.newaxis]).astype(np.uint8)
+        return self.gradient
+
+    def colors(self, particles, color_start_hue=0.0, color_end_hue=240.0, color_directional=True, rgb_values=None):
+        # (n, 3) uint8 colour per particle
+        total = len(particles)
+        if color_directional:
+            lut = self._hue_lut(color_start_hue, color_end_hue)
+            idx = (particles.angle_deg[:total] * (self.hue_steps / 360.0) + 0.5).astype(np.intp)
+            return lut.take(idx, axis=0, mode='clip')
+        if rgb_values is None:
+            return np.full((total, 3), 255, dtype=np.uint8)
+        return self._gradient(rgb_values, total)
+
+
+class ParticleRenderer:
+    # Draws every particle in a handful of calls. Small footprints are
+    # scattered straight into the target's pixels; larger ones are blitted
+    # from stamps cached per (size, shape, colour bucket). Footprints are taken
+    # from pygame.draw itself so the result matches the old per-particle
+    # circle/rect calls pixel for pixel.
+    SCATTER_MAX_PIXELS = 48
+    # Most a stamped particle's colour is off by, per channel (see _blit)
+    STAMP_COLOR_ERROR = 4
+
+    def __init__(self):
+        self.footprints = {}
+        self.stamps = {}
+
+    def footprint(self, size, shape):
+        key = (size, shape)
+        if key not in self.footprints:
+            c = size + 1
+            surf = pygame.Surface((2 * c + 1, 2 * c + 1))
+            if shape == 0:
+                pygame.draw.circle(surf, (255, 255, 255), (c, c), size)
+            else:
+                pygame.draw.rect(surf, (255, 255, 255), (c - size, c - size, 2 * size, 2 * size))
+            mask = pygame.surfarray.array2d(surf) != 0
+            dx, dy = np.nonzero(mask)
+            self.footprints[key] = (dx - c, dy - c, mask[dx.min():dx.max() + 1, dy.min():dy.max() + 1])
+        return self.footprints[key]
+
+    def stamp(self, size, shape, bucket):
+        key = (size, shape, bucket)
+        stamp = self.stamps.get(key)
+        if stamp is None:
+            _, _, mask = self.footprint(size, shape)
+            color = ((bucket >> 16) & 255, (bucket >> 8) & 255, bucket & 255)
+            key_color = (255 - color[0], 255 - color[1], 255 - color[2])
+            stamp = pygame.Surface(mask.shape)
+            stamp.fill(key_color)
+            pixels = pygame.surfarray.pixels3d(stamp)
+            pixels[mask] = color
+            del pixels
+            stamp.set_colorkey(key_color, pygame.RLEACCEL)
+            self.stamps[key] = stamp
+        return stamp
+
+    def draw(self, surface, x, y, colors, particle_size=3, particle_shape=0):
+        if len(x) == 0:
+            return
+        size = max(1, int(particle_size))
+        shape = 1 if particle_shape else 0
+        ix = x.astype(np.intp)
+        iy = y.astype(np.intp)
+        dx, dy, mask = self.footprint(size, shape)
+        if len(dx) <= self.SCATTER_MAX_PIXELS and surface.get_bytesize() in (2, 4):
+            self._scatter(surface, ix, iy, colors, dx, dy)
+        else:
+            self._blit(surface, ix + int(dx.min()), iy + int(dy.min()), colors, size, shape)
+
+    def _scatter(self, surface, ix, iy, colors, dx, dy):
+        width, height = surface.get_size()
+        shifts = surface.get_shifts()
+        losses = surface.get_losses()
+        c = colors.astype(np.uint32)
+        mapped = ((c[:, 0] >> losses[0]) << shifts[0]) | ((c[:, 1] >> losses[1]) << shifts[1]) | ((c[:, 2] >> losses[2]) << shifts[2])
+        if surface.get_masks()[3]:
+            mapped |= np.uint32(surface.get_masks()[3])
+        # One (particle, offset) entry per footprint pixel, particle-major so
+        # later particles still overwrite earlier ones where they overlap
+        px = ix[:, np.newaxis] + dx
+        py = iy[:, np.newaxis] + dy
+        values = np.repeat(mapped, len(dx))
+        # Only particles near the edges need per-pixel bounds checks
+        edge = ~((ix >= -dx.min()) & (ix < width - dx.max()) & (iy >= -dy.min()) & (iy < height - dy.max()))
+        keep = None
+        if edge.any():
+            keep = np.ones(px.shape, dtype=bool)
+            ex = px[edge]
+            ey = py[edge]
+            keep[edge] = (ex >= 0) & (ex < width) & (ey >= 0) & (ey < height)
+            keep = keep.ravel()
+        pixels = pygame.surfarray.pixels2d(surface)
+        rows = pixels.T
+        if rows.flags.c_contiguous:
+            flat = (py * width + px).ravel()
+            if keep is not None:
+                flat = flat[keep]
+                values = values[keep]
+            rows.reshape(-1)[flat] = values
+        else:
+            px = px.ravel()
+            py = py.ravel()
+            if keep is not None:
+                px = px[keep]
+                py = py[keep]
+                values = values[keep]
+            pixels[px, py] = values
+        del pixels
+
+    def _blit(self, surface, left, top, colors, size, shape):
+        # Colours are bucketed to 5 bits per channel so the stamp cache stays
+        # bounded; the error is at most 4/255 per channel
+        c = (colors.astype(np.uint32) >> 3) << 3
+        buckets = (c[:, 0] << 16) | (c[:, 1] << 8) | c[:, 2] | 0x040404
+        unique, inverse = np.unique(buckets, return_inverse=True)
+        lookup = np.empty(len(unique), dtype=object)
+        lookup[:] = [self.stamp(size, shape, int(b)) for b in unique.tolist()]
+        stamps = lookup[inverse.ravel()].tolist()
+        surface.blits(list(zip(stamps, zip(left.tolist(), top.tolist()))), doreturn=False)
@@ -0,0 +1,284 @@
+import json
+import os
+import numpy as np
+from particles import ParticleSystem, lfo_value
+from backends import BACKENDS, DEFAULT_BACKEND, create_backend
+from flowfield import NOISE_SCALE, BakedField, FieldGrid
+from render import ColorMapper, DensityBackground
+from spatial import Flocking
+
+# Simulation time advanced per step
+TIME_STEP = 0.005
+# Steps per second of wall-clock time when driven by Simulation.advance();
+# 60 keeps the original pace of one step per frame at 60 fps
+SIM_HZ = 60
+# advance() gives up on catching up beyond this many steps per call, so one
+# very slow frame doesn't snowball into ever longer ones
+MAX_SUBSTEPS = 8
+
+# Presets are JSON files holding a full set of slider values. The default
+# preset is what the app starts with and what "Reset" goes back to.
+PRESET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'presets')
+DEFAULT_PRESET = os.path.join(PRESET_DIR, 'default.json')
+
+# Built-in values, used for any key a preset doesn't set (or if there is no
+# default preset at all). Also defines which keys and types a preset has.
+DEFAULT_PARAMS = dict(
+    speed=3.0,
+    steering_strength=0.01,
+    res_grid_size=32,
+    show_density_bg=False,
+    color_start_hue=0.0,
+    color_end_hue=240.0,
+    particle_size=1,
+    particle_shape=0,
+    color_directional=False,
+    lfo_enabled=False,
+    lfo_amplitude=0.0,
+    lfo_rate=0.0,
+    waveform=0,  # 0=sine, 1=square, 2=triangle, 3=saw
+    rgb_values=[255, 0, 0, 0, 0, 255],  # Default: red to blue
+    field_grid_enabled=False,
+    grid_cell_size=32,
+    grid_refresh=4,
+    baked_field_enabled=False,
+    bake_period=8,  # Loop length in noise time; 8 is about 27 s at SIM_HZ
+    flocking_enabled=False,
+    flock_radius=15.0,
+    flock_separation=1.0,
+    flock_alignment=0.5,
+    flock_cohesion=0.3
+)
+
+
+def load_preset(path):
+    # Parameters from a preset file, on top of the built-in values. Unknown
+    # keys are ignored and values are coerced to the built-in types.
+    with open(path) as f:
+        data = json.load(f)
+    data = data.get('params', data)
+    params = dict(DEFAULT_PARAMS)
+    params['rgb_values'] = list(DEFAULT_PARAMS['rgb_values'])
+    for key, default in DEFAULT_PARAMS.items():
+        if key not in data:
+            continue
+        if isinstance(default, list):
+            params[key] = [type(d)(v) for d, v in zip(default, data[key])]
+        else:
+            params[key] = type(default)(data[key])
+    return params
+
+
+def save_preset(path, params):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({key: params[key] for key in DEFAULT_PARAMS}, f, indent=4)
+        f.write('\n')
+
+
+def default_params():
+    if os.path.exists(DEFAULT_PRESET):
+        return load_preset(DEFAULT_PRESET)
+    params = dict(DEFAULT_PARAMS)
+    params['rgb_values'] = list(DEFAULT_PARAMS['rgb_values'])
+    return params
+
+
+class Simulation:
+    # Particles, flow field and renderers for one scene, shared by the
+    # interactive window and the offline renderer. With a seed, particle
+    # placement is reproducible and so is every frame after it. With more
+    # than one worker the update runs in a parallel.WorkerPool, which gives
+    # the same result as the single-process update. The maths for step,
+    # density and drawing comes from a backend (see backends.py), which can
+    # be swapped at any time with set_backend().
+    def __init__(self, width, height, particle_count, params=None, seed=None, noise_scale=NOISE_SCALE, workers=1, sim_hz=SIM_HZ,
+                 backend=DEFAULT_BACKEND):
+        self.width = width
+        self.height = height
+        self.params = params if params is not None else default_params()
+        rng = np.random.default_rng(seed)
+        self.pool = None
+        if workers > 1:
+            from parallel import SharedParticleSystem, WorkerPool
+            self.particles = SharedParticleSystem(particle_count, width, height, noise_scale=noise_scale, rng=rng)
+            self.pool = WorkerPool(self.particles, workers, time_step=TIME_STEP, noise_scale=noise_scale)
+        else:
+            self.particles = ParticleSystem(particle_count, width, height, noise_scale=noise_scale, rng=rng)
+        self.field_grid = FieldGrid(width, height, self.params['grid_cell_size'], self.params['grid_refresh'],
+                                    time_step=TIME_STEP, noise_scale=noise_scale)
+        self.baked_field = BakedField(width, height, self.params['bake_period'], noise_scale=noise_scale)
+        self.flocking = Flocking(width, height)
+        # particles.version the flocking grid was built for
+        self.flocked_version = None
+        self.density_bg = DensityBackground()
+        self.backend = create_backend(backend)
+        self.color_mapper = ColorMapper()
+        self.flip_dim = False
+        self.paused = False
+        self.t = 0.0
+        self.sim_hz = sim_hz
+        self.accumulator = 0.0
+        # Positions before the latest step, for interpolated drawing
+        self.prev_x = np.zeros(0)
+        self.prev_y = np.zeros(0)
+        self.prev_count = 0
+        # Quality overrides (see quality.QualityController): only the first
+        # active_limit particles are updated and drawn, the noise is sampled
+        # every update_every steps, and the density grid and particle size
+        # are clamped. The defaults leave the params untouched.
+        self.active_limit = None
+        self.update_every = 1
+        self.min_grid_size = 0
+        self.max_particle_size = None
+        self.steps = 0
+
+    def set_backend(self, name):
+        if name != self.backend.name:
+            self.backend = create_backend(name)
+
+    def active_count(self):
+        n = len(self.particles)
+        return n if self.active_limit is None else min(n, self.active_limit)
+
+    def advance(self, elapsed, max_steps=MAX_SUBSTEPS):
+        # Fixed-timestep scheduler: runs as many whole steps as `elapsed`
+        # seconds of wall-clock time cover at sim_hz and carries the rest
+        # over. Returns how far (0..1) the clock is between the last two
+        # states, for draw_particles(alpha=...).
+        self.accumulator += elapsed * self.sim_hz
+        steps = int(self.accumulator + 1e-9)
+        if max_steps is not None and steps > max_steps:
+            steps = max_steps
+            self.accumulator = steps
+        self.accumulator -= steps
+        for i in range(steps):
+            if i == steps - 1:
+                self.sync_previous()
+            self.step()
+        return min(max(self.accumulator, 0.0), 1.0)
+
+    def sync_previous(self):
+        # Make the current positions the interpolation start point. Also call
+        # after teleporting particles so they don't streak across the screen.
+        particles = self.particles
+        n = len(particles)
+        if len(self.prev_x) < particles.capacity:
+            self.prev_x = np.empty(particles.capacity)
+            self.prev_y = np.empty(particles.capacity)
+        self.prev_x[:n] = particles.x[:n]
+        self.prev_y[:n] = particles.y[:n]
+        self.prev_count = n
+
+    def interpolated_positions(self, alpha):
+        # Positions alpha of the way from the previous state to the current
+        # one. Particles that wrapped around an edge, or were added since,
+        # are drawn where they are now rather than dragged across the screen.
+        particles = self.particles
+        n = self.active_count()
+        x = particles.x[:n].copy()
+        y = particles.y[:n].copy()
+        m = min(n, self.prev_count)
+        if m and alpha < 1.0:
+            dx = x[:m] - self.prev_x[:m]
+            dy = y[:m] - self.prev_y[:m]
+            jump = (np.abs(dx) > self.width / 2) | (np.abs(dy) > self.height / 2)
+            dx[jump] = 0.0
+            dy[jump] = 0.0
+            x[:m] -= dx * (1.0 - alpha)
+            y[:m] -= dy * (1.0 - alpha)
+        return x, y
+
+    def step(self):
+        # Advance one frame. Time keeps running while paused, as it always has.
+        params = self.params
+        resample = self.steps % max(1, self.update_every) == 0
+        self.steps += 1
+        if self.pool is not None:
+            if not self.paused:
+                lfo_val = lfo_value(self.t, params['lfo_enabled'], params['lfo_amplitude'], params['lfo_rate'], params['waveform'])
+                if params['baked_field_enabled']:
+                    # Bake here once so the workers only ever map the file
+                    self.baked_field.configure(params['bake_period'])
+                    self.baked_field.volume(self.flip_dim)
+                self.pool.step(self.t, self.flip_dim, params['speed'], params['steering_strength'], lfo_val,
+                               params['field_grid_enabled'], params['grid_cell_size'], params['grid_refresh'],
+                               self.active_limit, resample, params['baked_field_enabled'], params['bake_period'],
+                               list(BACKENDS).index(self.backend.name))
+                self.particles.version += 1
+                self.flock()
+            self.t += TIME_STEP
+            return
+        if params['baked_field_enabled']:
+            self.baked_field.configure(params['bake_period'])
+            self.particles.field = self.baked_field
+        elif params['field_grid_enabled']:
+            self.field_grid.configure(params['grid_cell_size'], params['grid_refresh'])
+            self.particles.field = self.field_grid
+        else:
+            self.particles.field = None
+        if not self.paused:
+            lfo_val = lfo_value(self.t, params['lfo_enabled'], params['lfo_amplitude'], params['lfo_rate'], params['waveform'])
+            self.backend.step(self.particles, 0, self.active_count(), self.t, self.flip_dim, params['speed'],
+                              params['steering_strength'], lfo_val, resample)
+            self.particles.version += 1
+            self.flock()
+        self.t += TIME_STEP
+
+    def flock(self):
+        # Neighbour forces on top of the noise steering. Only velocities
+        # change, so the spatial grid stays valid for the positions until the
+        # next step.
+        params = self.params
+        if params['flocking_enabled']:
+            self.flocking.apply(self.particles, self.active_count(), params['flock_radius'], params['flock_separation'],
+                                params['flock_alignment'], params['flock_cohesion'], params['speed'], params['steering_strength'])
+            self.flocked_version = self.particles.version
+
+    def close(self):
+        # Stops the worker pool and frees shared memory, if any
+        if self.pool is not None:
+            self.pool.close()
+            self.particles.close()
+            self.pool = None
+
+    def draw_background(self, surface):
+        # Density background if enabled, else clear screen
+        if self.params['show_density_bg']:
+            grid_size = max(int(self.params['res_grid_size']), self.min_grid_size)
+            density = None
+            spatial = self.flocking.grid
+            if (self.flocked_version == self.particles.version and spatial.cell_size == grid_size
+                    and spatial.n == self.active_count()):
+                # The flocking pass already binned these positions at this
+                # size (its cells are the flock radius rounded up)
+                density = spatial.cell_counts()
+            self.density_bg.draw(surface, self.particles, grid_size=grid_size, count=self.active_count(), density=density,
+                                 binning=self.backend.density)
+        else:
+            surface.fill((0, 0, 0))
+
+    def draw_particles(self, surface, alpha=None):
+        # With alpha, positions are interpolated (see advance()). Simulation
+        # space is stretched over the surface, so it may be any size.
+        params = self.params
+        particles = self.particles
+        colors = self.color_mapper.colors(particles, params['color_start_hue'], params['color_end_hue'],
+                                          params['color_directional'], params['rgb_values'])
+        n = self.active_count()
+        if alpha is None:
+            x, y = particles.x[:n], particles.y[:n]
+        else:
+            x, y = self.interpolated_positions(alpha)
+        size = params['particle_size']
+        if self.max_particle_size is not None:
+            size = min(size, self.max_particle_size)
+        sx = surface.get_width() / self.width
+        sy = surface.get_height() / self.height
+        if sx != 1.0 or sy != 1.0:
+            x = x * sx
+            y = y * sy
+            size = max(1, int(size * (sx + sy) / 2 + 0.5))
+        self.backend.render(surface, x, y, colors[:n], size, params['particle_shape'])
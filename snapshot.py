@@ -0,0 +1,99 @@
+import json
+import os
+import numpy as np
+from simulation import DEFAULT_PARAMS, load_preset
+
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_paths(path):
+    # A snapshot is <base>.npy (particle arrays) plus <base>.json (sidecar)
+    base, ext = os.path.splitext(path)
+    if ext not in ('.npy', '.json'):
+        base = path
+    return base + '.npy', base + '.json'
+
+
+def save_snapshot(path, sim):
+    # Particle arrays go into a .npy file written through a memory map, so
+    # nothing the size of the particle store is built in memory. Time, flip
+    # state and every parameter go into a small JSON sidecar, which also
+    # loads as a preset.
+    array_path, sidecar_path = snapshot_paths(path)
+    directory = os.path.dirname(array_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    particles = sim.particles
+    n = len(particles)
+    # Written under a temporary name and renamed into place: the file being
+    # replaced may still be mapped by the running simulation
+    tmp_path = array_path + '.tmp'
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=(len(particles.FIELDS), n))
+    for i, name in enumerate(particles.FIELDS):
+        out[i] = getattr(particles, name)[:n]
+    out.flush()
+    del out
+    # Windows won't replace a file that is still mapped, and after a load
+    # the particle arrays are: take them into memory first
+    mapped = getattr(particles.x, 'filename', None)
+    if mapped is not None and os.path.abspath(mapped) == os.path.abspath(array_path):
+        particles.use_arrays(np.stack([getattr(particles, name)[:n] for name in particles.FIELDS]))
+    os.replace(tmp_path, array_path)
+    sidecar = dict(
+        version=SNAPSHOT_VERSION,
+        particles=os.path.basename(array_path),
+        fields=list(particles.FIELDS),
+        count=n,
+        width=sim.width,
+        height=sim.height,
+        t=sim.t,
+        flip_dim=sim.flip_dim,
+        params={key: sim.params[key] for key in DEFAULT_PARAMS},
+    )
+    with open(sidecar_path, 'w') as f:
+        json.dump(sidecar, f, indent=4)
+        f.write('\n')
+    return array_path, sidecar_path
+
+
+def load_snapshot(path, sim):
+    # Restores a snapshot into `sim`. The particle file is mapped
+    # copy-on-write, so loading doesn't read it up front and the simulation
+    # can still update the arrays in place without touching the file.
+    # Anything wrong with the files (bad JSON, another version or field
+    # layout, missing entries) raises ValueError before `sim` is touched.
+    array_path, sidecar_path = snapshot_paths(path)
+    with open(sidecar_path) as f:
+        sidecar = json.load(f)
+    if not isinstance(sidecar, dict):
+        raise ValueError(f"{sidecar_path}: not a snapshot sidecar")
+    if sidecar.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"{sidecar_path}: unsupported snapshot version {sidecar.get('version')!r}")
+    particles = sim.particles
+    try:
+        fields, name, count = sidecar['fields'], sidecar['particles'], sidecar['count']
+        width, height = sidecar['width'], sidecar['height']
+        t, flip_dim = sidecar['t'], sidecar['flip_dim']
+    except KeyError as exc:
+        raise ValueError(f"{sidecar_path}: snapshot is missing {exc}") from None
+    if fields != list(particles.FIELDS):
+        raise ValueError(f"{sidecar_path}: snapshot fields {fields} don't match {list(particles.FIELDS)}")
+    arrays = np.load(os.path.join(os.path.dirname(sidecar_path), name), mmap_mode='c')
+    if arrays.shape != (len(fields), count):
+        raise ValueError(f"{sidecar_path}: particle file holds {arrays.shape}, expected {(len(fields), count)}")
+    try:
+        params = load_preset(sidecar_path)
+    except TypeError as exc:
+        raise ValueError(f"{sidecar_path}: bad parameter value ({exc})") from None
+    particles.use_arrays(arrays)
+    if (width, height) != (sim.width, sim.height):
+        # Saved at another window size: stretch positions over this
+        # simulation space so wrap-around and binning stay in range
+        particles.x *= sim.width / width
+        particles.y *= sim.height / height
+    for key in DEFAULT_PARAMS:
+        sim.params[key] = params[key]
+    sim.t = t
+    sim.flip_dim = flip_dim
+    sim.sync_previous()
+    return sidecar
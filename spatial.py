@@ -0,0 +1,213 @@
+import math
+import numpy as np
+
+# Pairs examined per batch in neighbour queries; bounds temporary memory
+PAIR_BATCH = 1 << 20
+
+_OFFSETS = np.array([(dc, dr) for dc in (-1, 0, 1) for dr in (-1, 0, 1)], dtype=np.intp)
+# A cell and the 4 neighbours "after" it: every pair of adjacent cells once
+_HALF_OFFSETS = np.array([(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)], dtype=np.intp)
+
+
+class SpatialGrid:
+    # Uniform-grid spatial hash (cell list), rebuilt from scratch each frame.
+    # Cells are laid out like render.bin_counts (grid_size squares, [col,
+    # row] with the partial cells at the right and bottom edges), and built
+    # with a counting sort: a histogram of cell ids, its prefix sum as each
+    # cell's start, and a stable ordering of particles by cell id.
+    def __init__(self, width, height, cell_size=20):
+        self.width = width
+        self.height = height
+        self.cell_size = None
+        self.configure(cell_size)
+        self.n = 0
+        self.cell = np.zeros(0, dtype=np.intp)
+        self.counts = np.zeros(self.cols * self.rows, dtype=np.intp)
+        self.starts = np.zeros(self.cols * self.rows, dtype=np.intp)
+        self.order = np.zeros(0, dtype=np.intp)
+
+    def configure(self, cell_size):
+        cell_size = max(1, int(cell_size))
+        if cell_size != self.cell_size:
+            self.cell_size = cell_size
+            self.cols = self.width // cell_size + 1
+            self.rows = self.height // cell_size + 1
+
+    def build(self, x, y):
+        inv = 1.0 / self.cell_size
+        col = np.clip((x * inv).astype(np.intp), 0, self.cols - 1)
+        row = np.clip((y * inv).astype(np.intp), 0, self.rows - 1)
+        cells = self.cols * self.rows
+        self.n = len(x)
+        self.cell = col * self.rows + row
+        self.counts = np.bincount(self.cell, minlength=cells)
+        self.starts = np.cumsum(self.counts) - self.counts
+        # A stable sort on 16-bit keys is a radix sort in NumPy, so with up
+        # to 65536 cells this is the counting sort's scatter pass. Bigger
+        # grids take two such passes, low 16 bits of the cell id first
+        # (an LSD radix sort), which is just as stable.
+        if cells <= 1 << 16:
+            self.order = np.argsort(self.cell.astype(np.uint16), kind='stable')
+        else:
+            low = np.argsort((self.cell & 0xFFFF).astype(np.uint16), kind='stable')
+            self.order = low[np.argsort((self.cell[low] >> 16).astype(np.uint16), kind='stable')]
+
+    def cell_counts(self):
+        # Particles per cell as a (cols, rows) array; identical to
+        # render.bin_counts(x, y, cell_size, cols, rows) for the same points
+        return self.counts.reshape(self.cols, self.rows)
+
+    def neighbourhood_sizes(self):
+        # Per particle (in particle order), how many particles are in its
+        # cell and the 8 around it, itself included: the candidates
+        # neighbour_pairs(half=False) would give it without a cap
+        padded = np.pad(self.cell_counts(), 1)
+        box = sum(padded[1 + dc:1 + dc + self.cols, 1 + dr:1 + dr + self.rows] for dc, dr in _OFFSETS)
+        return box.ravel()[self.cell]
+
+    def neighbour_lists(self, half=False):
+        # For every cell, the particles in it and its 8 neighbours as one
+        # flat array: lists[starts[c]:starts[c] + lengths[c]]. With half=True
+        # only the 4 neighbours after it are included, so each pair of cells
+        # is covered once.
+        offsets = _HALF_OFFSETS if half else _OFFSETS
+        cells = self.cols * self.rows
+        ids = np.arange(cells)
+        col = ids // self.rows
+        row = ids % self.rows
+        ncol = col[:, np.newaxis] + offsets[:, 0]
+        nrow = row[:, np.newaxis] + offsets[:, 1]
+        valid = (ncol >= 0) & (ncol < self.cols) & (nrow >= 0) & (nrow < self.rows)
+        ncell = np.where(valid, ncol * self.rows + nrow, 0)
+        # Empty cells need no list of their own
+        ncount = np.where(valid & (self.counts[:, np.newaxis] > 0), self.counts[ncell], 0).ravel()
+        total = int(ncount.sum())
+        shift = self.starts[ncell].ravel() - (np.cumsum(ncount) - ncount)
+        lists = self.order[np.arange(total) + np.repeat(shift, ncount)]
+        lengths = ncount.reshape(cells, len(offsets)).sum(axis=1)
+        return lists, np.cumsum(lengths) - lengths, lengths
+
+    def neighbour_pairs(self, max_per_particle=None, half=False):
+        # Yields (i, j) batches of candidate pairs: every particle i with
+        # every particle j in its own and the 8 surrounding cells (including
+        # i itself), about PAIR_BATCH pairs at a time. The caller filters by
+        # distance. With half=True each unordered pair comes up once: cells
+        # are paired with their neighbours after them and, within a cell,
+        # only i < j is kept.
+        #
+        # max_per_particle caps the candidates of each particle, which keeps
+        # the pair count linear in n however clustered the particles are. A
+        # particle with more candidates than that gets an evenly spaced
+        # sample of its whole neighbourhood (every cell in proportion, with a
+        # per-particle phase so neighbours see different subsets); one with
+        # fewer gets them all, exactly as without a cap. A cap needs the
+        # full neighbourhood, so it can't be combined with half=True.
+        if half and max_per_particle is not None:
+            raise ValueError("max_per_particle needs the full neighbourhood (half=False)")
+        lists, list_starts, lengths = self.neighbour_lists(half)
+        order = self.order
+        cell = self.cell[order]
+        sizes = lengths[cell]
+        pair_counts = sizes if max_per_particle is None else np.minimum(sizes, max_per_particle)
+        per_particle = np.cumsum(pair_counts)
+        lo = 0
+        while lo < self.n:
+            # Largest run of particles whose pairs fit in one batch (at least one)
+            base = per_particle[lo - 1] if lo else 0
+            hi = max(int(np.searchsorted(per_particle, base + PAIR_BATCH, side='right')), lo + 1)
+            counts = pair_counts[lo:hi]
+            total = int(per_particle[hi - 1] - base)
+            rank = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            if max_per_particle is not None:
+                # rank k of m taken from a list of L: (k * L + phase) // m,
+                # which is just k when nothing was dropped (m == L)
+                taken = np.maximum(counts, 1)
+                phase = order[lo:hi] % taken
+                rank = (rank * np.repeat(sizes[lo:hi], counts) + np.repeat(phase, counts)) // np.repeat(taken, counts)
+            j = lists[np.repeat(list_starts[cell[lo:hi]], counts) + rank]
+            i = np.repeat(order[lo:hi], counts)
+            if half:
+                keep = (i < j) | (self.cell[j] != np.repeat(cell[lo:hi], counts))
+                i, j = i[keep], j[keep]
+            yield i, j
+            lo = hi
+
+
+class Flocking:
+    # Separation, alignment and cohesion from neighbours within `radius`,
+    # found through a SpatialGrid with radius-sized cells. The result is a
+    # velocity nudge that goes through the same steering strength as the
+    # noise, so the two blend.
+    #
+    # Each particle looks at no more than MAX_NEIGHBOURS candidates from the
+    # 3x3 cells around it. Up to that many the result is exact (the same as
+    # comparing every pair); past it, in crowded spots, the neighbours are an
+    # evenly spaced sample of the neighbourhood and the sums are scaled up
+    # to the whole of it. Averages (alignment, cohesion) are then estimates
+    # from the sample and the separation push an extrapolation, so the
+    # nudge is close to, not equal to, the exact one.
+    MAX_NEIGHBOURS = 64
+
+    def __init__(self, width, height):
+        self.grid = SpatialGrid(width, height)
+
+    def apply(self, particles, count, radius=15.0, separation=1.0, alignment=0.5, cohesion=0.3, speed=3.0, steering_strength=0.01):
+        n = min(count, len(particles))
+        if n < 2 or radius <= 0:
+            return
+        x = particles.x[:n]
+        y = particles.y[:n]
+        vx = particles.vx[:n]
+        vy = particles.vy[:n]
+        grid = self.grid
+        # Cells must be at least the radius wide, or the 3x3 neighbourhood
+        # misses pairs across a cell
+        grid.configure(math.ceil(radius))
+        grid.build(x, y)
+        # float32 is plenty for offsets within one radius
+        xf, yf = x.astype(np.float32), y.astype(np.float32)
+        vxf, vyf = vx.astype(np.float32), vy.astype(np.float32)
+        r2 = np.float32(radius * radius)
+        inv_r = np.float32(1.0 / radius)
+        # Per particle: neighbour count, sum of offsets, sum of neighbour
+        # velocities and the separation push
+        sums = np.zeros((7, n))
+        sizes = grid.neighbourhood_sizes()
+        crowded = sizes > self.MAX_NEIGHBOURS
+        # With no crowded particle every pair is exact, so each is found
+        # once and counted for both particles
+        half = not crowded.any()
+        pairs = grid.neighbour_pairs(half=True) if half else grid.neighbour_pairs(self.MAX_NEIGHBOURS)
+        for i, j in pairs:
+            dx = np.take(xf, j) - np.take(xf, i)
+            dy = np.take(yf, j) - np.take(yf, i)
+            d2 = dx * dx + dy * dy
+            near = np.flatnonzero((d2 < r2) & (d2 > 0))
+            i, j, dx, dy = i[near], j[near], dx[near], dy[near]
+            d = np.sqrt(d2[near])
+            # Push away along the unit vector, harder the closer the neighbour
+            sep_x = (1 - d * inv_r) / d * dx
+            sep_y = (1 - d * inv_r) / d * dy
+            for row, weights in enumerate((None, dx, dy, np.take(vxf, j), np.take(vyf, j), -sep_x, -sep_y)):
+                sums[row] += np.bincount(i, weights, minlength=n)
+            if half:
+                for row, weights in enumerate((None, -dx, -dy, np.take(vxf, i), np.take(vyf, i), sep_x, sep_y)):
+                    sums[row] += np.bincount(j, weights, minlength=n)
+        # Sampled neighbourhoods stand for the whole of them
+        if not half:
+            sums[:, crowded] *= sizes[crowded] / self.MAX_NEIGHBOURS
+        k = sums[0]
+        has = k > 0
+        if not has.any():
+            return
+        k = k[has]
+        s = sums[:, has].T
+        # Separation capped to unit length, cohesion is the offset to the
+        # neighbours' centre in radii, alignment the velocity difference
+        scale = 1.0 / np.maximum(np.hypot(s[:, 5], s[:, 6]), 1.0)
+        ax = s[:, 3] / k - vx[has]
+        ay = s[:, 4] / k - vy[has]
+        cx = s[:, 1] / (k * radius)
+        cy = s[:, 2] / (k * radius)
+        vx[has] += steering_strength * (speed * (separation * s[:, 5] * scale + cohesion * cx) + alignment * ax)
+        vy[has] += steering_strength * (speed * (separation * s[:, 6] * scale + cohesion * cy) + alignment * ay)
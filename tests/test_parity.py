@@ -0,0 +1,20 @@
+import pytest
+import bench
+from backends import available_backends
+
+
+@pytest.fixture(scope='module')
+def backend_parity():
+    # One run covers every backend; it is the slow part
+    return {row['backend']: row for row in bench.check_backend_parity()}
+
+
+def test_noise_parity():
+    result = bench.check_noise_parity()
+    assert result['ok'], result
+
+
+@pytest.mark.parametrize('name', available_backends())
+def test_backend_parity(backend_parity, name):
+    row = backend_parity[name]
+    assert row['ok'], row
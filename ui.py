@@ -0,0 +1,348 @@
+import io
+import os
+import pygame
+
+# The one font the UI uses, shipped with the app (build.spec bundles it) so
+# nothing has to scan the system's fonts at startup
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts', 'freesansbold.ttf')
+
+TEXT_COLOR = (255, 255, 255)
+MENU_BG_COLOR = (30, 30, 30)
+BTN_COLOR = (50, 50, 50)
+BTN_HOVER = (100, 0, 0)
+SLIDER_COLOR = (80, 80, 80)
+HANDLE_COLOR = (200, 0, 0)
+# Greyed-out variants used while paused
+PAUSED_BTN_COLOR = (120, 120, 120)
+PAUSED_BTN_HOVER = (180, 180, 180)
+PAUSED_SLIDER_COLOR = (120, 120, 120)
+PAUSED_HANDLE_COLOR = (180, 180, 180)
+
+_fonts = {}
+_font_data = None
+
+
+def get_font(size):
+    # Fonts are created once per size and shared by every widget. The font
+    # file is read once; every size is opened from the same bytes.
+    global _font_data
+    font = _fonts.get(size)
+    if font is None:
+        if _font_data is None:
+            with open(FONT_PATH, 'rb') as f:
+                _font_data = f.read()
+        font = _fonts[size] = pygame.font.Font(io.BytesIO(_font_data), size)
+    return font
+
+
+class TextCache:
+    # Rendered text surfaces, re-rendered only when the string or colour changes
+    def __init__(self, size):
+        self.size = size
+        self.key = None
+        self.surface = None
+
+    def render(self, text, color=TEXT_COLOR):
+        if (text, color) != self.key:
+            self.key = (text, color)
+            self.surface = get_font(self.size).render(text, True, color)
+        return self.surface
+
+
+class Widget:
+    def __init__(self, rect, visible=None):
+        self.rect = rect
+        # Optional callable(params) -> bool; hidden widgets keep their slot
+        self.visible = visible
+
+    def is_visible(self, params):
+        return self.visible is None or self.visible(params)
+
+    def hit(self, pos, params):
+        return self.rect.collidepoint(pos)
+
+    def state(self, params, hovered, paused):
+        return (hovered, paused)
+
+
+class Button(Widget):
+    def __init__(self, rect, action, label, visible=None):
+        super().__init__(rect, visible)
+        self.action = action
+        # A string, or callable(params) -> string for labels that change
+        self.label = label
+        self.text = TextCache(36)
+
+    def label_text(self, params):
+        return self.label(params) if callable(self.label) else self.label
+
+    def state(self, params, hovered, paused):
+        return (hovered, paused, self.label_text(params))
+
+    def draw(self, surface, params, hovered, paused, dy=0):
+        rect = self.rect.move(0, dy)
+        if paused:
+            color = PAUSED_BTN_HOVER if hovered else PAUSED_BTN_COLOR
+        else:
+            color = BTN_HOVER if hovered else BTN_COLOR
+        pygame.draw.rect(surface, color, rect)
+        text_surf = self.text.render(self.label_text(params))
+        return surface.blit(text_surf, text_surf.get_rect(center=rect.center))
+
+
+class Slider(Widget):
+    def __init__(self, rect, key, min_val, max_val, label, convert=float, index=None, visible=None):
+        super().__init__(rect, visible)
+        self.key = key
+        self.index = index
+        self.min_val = min_val
+        self.max_val = max_val
+        self.label = label
+        # Maps the raw slider position (min_val..max_val) to the stored value
+        self.convert = convert
+        self.text = TextCache(28)
+
+    def get(self, params):
+        value = params[self.key]
+        return value[self.index] if self.index is not None else value
+
+    def set(self, params, value):
+        if self.index is not None:
+            params[self.key][self.index] = value
+        else:
+            params[self.key] = value
+
+    def set_clamped(self, params, value):
+        # Set from an outside value, kept to what dragging could produce
+        self.set(params, self.convert(min(max(value, self.min_val), self.max_val)))
+
+    def handle_rect(self, value, rect=None):
+        rect = rect or self.rect
+        handle_x = rect.x + int((value - self.min_val) / (self.max_val - self.min_val) * rect.width)
+        return pygame.Rect(handle_x - 8, rect.centery - 12, 16, 24)
+
+    def hit(self, pos, params):
+        return self.rect.collidepoint(pos) or self.handle_rect(self.get(params)).collidepoint(pos)
+
+    def drag(self, params, x):
+        rel_x = min(max(x - self.rect.x, 0), self.rect.width)
+        self.set(params, self.convert(self.min_val + (self.max_val - self.min_val) * (rel_x / self.rect.width)))
+
+    def label_text(self, params):
+        value = self.get(params)
+        label = self.label(params) if callable(self.label) else self.label
+        return f"{label}: {value:.3f}"
+
+    def state(self, params, hovered, paused):
+        return (paused, self.get(params), self.label_text(params))
+
+    def draw(self, surface, params, hovered, paused, dy=0):
+        rect = self.rect.move(0, dy)
+        value = self.get(params)
+        pygame.draw.rect(surface, PAUSED_SLIDER_COLOR if paused else SLIDER_COLOR, rect, border_radius=5)
+        pygame.draw.rect(surface, PAUSED_HANDLE_COLOR if paused else HANDLE_COLOR, self.handle_rect(value, rect), border_radius=6)
+        val_surf = self.text.render(self.label_text(params))
+        return surface.blit(val_surf, (rect.x + rect.width + 20, rect.y + rect.height // 2 - 14))
+
+
+class Toggle(Widget):
+    def __init__(self, rect, key, label, visible=None):
+        super().__init__(rect, visible)
+        self.key = key
+        self.label = label
+        self.text = TextCache(28)
+
+    def state(self, params, hovered, paused):
+        return (bool(params[self.key]),)
+
+    def draw(self, surface, params, hovered, paused, dy=0):
+        state = params[self.key]
+        rect = self.rect.move(0, dy)
+        pygame.draw.rect(surface, (80, 80, 80), rect, border_radius=12)
+        knob_rect = pygame.Rect(rect.x + (rect.width // 2 if state else 0), rect.y, rect.width // 2, rect.height)
+        pygame.draw.rect(surface, (0, 200, 0) if state else (200, 0, 0), knob_rect, border_radius=12)
+        label_surf = self.text.render(self.label)
+        return surface.blit(label_surf, (rect.x + rect.width + 10, rect.y + rect.height // 2 - 14))
+
+
+class Label(Widget):
+    # Read-only line of text; `text` is a string or callable(params) -> string
+    def __init__(self, rect, text, visible=None):
+        super().__init__(rect, visible)
+        self.text_source = text
+        self.text = TextCache(28)
+
+    def label_text(self, params):
+        return self.text_source(params) if callable(self.text_source) else self.text_source
+
+    def hit(self, pos, params):
+        return False
+
+    def state(self, params, hovered, paused):
+        return (paused, self.label_text(params))
+
+    def draw(self, surface, params, hovered, paused, dy=0):
+        rect = self.rect.move(0, dy)
+        text_surf = self.text.render(self.label_text(params), (200, 200, 200) if paused else TEXT_COLOR)
+        return surface.blit(text_surf, (rect.x, rect.centery - text_surf.get_height() // 2))
+
+
+class Menu:
+    # Retained-mode menu: widgets are registered once in a vertical stack and
+    # rendered into an offscreen surface that is only redrawn when a value,
+    # hover state or pause state changes. Slider labels overhang the panel to
+    # the right, so they go into a separate transparent strip.
+    def __init__(self, width, height, menu_width=600, label_width=420, spacing=20):
+        self.width = width
+        self.height = height
+        self.menu_width = menu_width
+        self.label_width = label_width
+        self.spacing = spacing
+        self.widgets = []
+        self.ui_y = spacing
+        self.collapsed = False
+        self.scroll = 0
+        self.dragging = None
+        self.tab_rect = pygame.Rect(0, 0, 80, 80)
+        self.tab_text = TextCache(36)
+        self.count_text = TextCache(36)
+        self.rendered_state = None
+        self.content = None
+        self.panel = None
+        self.labels = None
+        self.label_rects = []
+
+    def _next_rect(self, width, height):
+        rect = pygame.Rect(20, self.ui_y, width, height)
+        self.ui_y += height + self.spacing
+        return rect
+
+    def add_button(self, action, label, visible=None):
+        widget = Button(self._next_rect(self.menu_width - 40, 50), action, label, visible)
+        self.widgets.append(widget)
+        return widget
+
+    def add_slider(self, key, min_val, max_val, label, convert=float, index=None, visible=None):
+        widget = Slider(self._next_rect(self.menu_width - 40, 20), key, min_val, max_val, label, convert, index, visible)
+        self.widgets.append(widget)
+        return widget
+
+    def add_toggle(self, key, label, visible=None):
+        widget = Toggle(self._next_rect(60, 32), key, label, visible)
+        self.widgets.append(widget)
+        return widget
+
+    def add_label(self, text, visible=None):
+        widget = Label(self._next_rect(self.menu_width - 40, 24), text, visible)
+        self.widgets.append(widget)
+        return widget
+
+    def controls(self):
+        # Every widget that does something, by name: sliders by parameter
+        # ("rgb_values/3" for list entries), toggles by parameter and buttons
+        # by action
+        controls = {}
+        for widget in self.widgets:
+            if isinstance(widget, Slider):
+                name = widget.key if widget.index is None else f"{widget.key}/{widget.index}"
+                controls[name] = widget
+            elif isinstance(widget, Toggle):
+                controls[widget.key] = widget
+            elif isinstance(widget, Button):
+                controls[widget.action] = widget
+        return controls
+
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+        self.scroll = max(min(self.height - self.ui_y, 0), self.scroll)
+        self.rendered_state = None
+
+    def _content_pos(self, pos):
+        return (pos[0], pos[1] - self.scroll)
+
+    def _widget_at(self, params, pos):
+        pos = self._content_pos(pos)
+        for widget in self.widgets:
+            if widget.is_visible(params) and widget.hit(pos, params):
+                return widget
+        return None
+
+    def handle_event(self, event, params):
+        # Returns a button action name, or None
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if self.tab_rect.collidepoint(event.pos):
+                self.collapsed = not self.collapsed
+                return None
+            if self.collapsed:
+                return None
+            widget = self._widget_at(params, event.pos)
+            if isinstance(widget, Slider):
+                self.dragging = widget
+                widget.drag(params, event.pos[0])
+            elif isinstance(widget, Toggle):
+                params[widget.key] = not params[widget.key]
+            elif isinstance(widget, Button):
+                return widget.action
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+            self.dragging = None
+        elif event.type == pygame.MOUSEWHEEL and not self.collapsed:
+            if pygame.mouse.get_pos()[0] < self.menu_width:
+                self.scroll = max(min(self.height - self.ui_y, 0), min(0, self.scroll + event.y * 60))
+        return None
+
+    def update(self, params, mouse_pos):
+        if self.dragging is not None:
+            self.dragging.drag(params, mouse_pos[0])
+
+    def _state(self, params, mouse_pos, paused):
+        content_pos = self._content_pos(mouse_pos)
+        state = [self.scroll, paused, self.height]
+        for widget in self.widgets:
+            visible = widget.is_visible(params)
+            state.append(visible)
+            if visible:
+                state.append(widget.state(params, widget.rect.collidepoint(content_pos), paused))
+        return state
+
+    def _render(self, params, mouse_pos, paused):
+        if self.content is None or self.content.get_height() != self.height:
+            self.content = pygame.Surface((self.menu_width + self.label_width, self.height), pygame.SRCALPHA)
+            self.panel = pygame.Surface((self.menu_width, self.height))
+            self.labels = self.content.subsurface((self.menu_width, 0, self.label_width, self.height))
+        content = self.content
+        # Transparent *white*, so antialiased white label text blended in
+        # here keeps its colour and only carries coverage in the alpha
+        content.fill((255, 255, 255, 0))
+        content.fill(MENU_BG_COLOR, (0, 0, self.menu_width, self.height))
+        content_pos = self._content_pos(mouse_pos)
+        strip = pygame.Rect(self.menu_width, 0, self.label_width, self.height)
+        self.label_rects = []
+        for widget in self.widgets:
+            if not widget.is_visible(params):
+                continue
+            # Skip widgets scrolled out of view
+            if widget.rect.bottom + 12 + self.scroll < 0 or widget.rect.top - 12 + self.scroll > self.height:
+                continue
+            text_rect = widget.draw(content, params, widget.rect.collidepoint(content_pos), paused, self.scroll)
+            if text_rect.colliderect(strip):
+                self.label_rects.append(text_rect.clip(strip).move(-self.menu_width, 0))
+        self.panel.blit(content, (0, 0), (0, 0, self.menu_width, self.height))
+
+    def draw(self, surface, params, mouse_pos, paused, particle_count):
+        if not self.collapsed:
+            state = self._state(params, mouse_pos, paused)
+            if state != self.rendered_state:
+                self._render(params, mouse_pos, paused)
+                self.rendered_state = state
+            surface.blit(self.panel, (0, 0))
+            # Only the label text is alpha-blended, not the whole strip
+            for rect in self.label_rects:
+                surface.blit(self.labels, (self.menu_width + rect.x, rect.y), rect)
+        # Tab (always visible)
+        pygame.draw.rect(surface, (60, 60, 60), self.tab_rect, border_radius=12)
+        surface.blit(self.tab_text.render('<' if not self.collapsed else '>'), (self.tab_rect.x + 8, self.tab_rect.y + 20))
+        if not self.collapsed:
+            # Total number of particles at the bottom of the menu
+            count_surf = self.count_text.render(f"Particles: {particle_count}", (200, 200, 200) if paused else (255, 255, 255))
+            surface.blit(count_surf, (20, self.height - 60))